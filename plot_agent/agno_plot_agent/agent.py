@@ -8,8 +8,10 @@ from agno.utils.log import logger
 from agno.workflow import Workflow
 from clickhouse_tools import ClickHouseTools
 from dotenv import load_dotenv
+from plan_cache import QueryPlan, plan_cache, plot_spec
 from plot_tools import PlotTools
 from pydantic import BaseModel, Field
+from result_store import result_store
 from traceloop.sdk import Traceloop
 from traceloop.sdk.decorators import agent, task, workflow
 
@@ -18,10 +20,14 @@ load_dotenv()
 Traceloop.init(app_name="agno")
 
 
+class SQLQuery(BaseModel):
+    query: str = Field(..., description="The ClickHouse SQL query answering the user's question.")
+
+
 class SQLQueryResult(BaseModel):
     query: str = Field(..., description="The SQL query that was executed.")
     column_names: List[str] = Field(..., description="List of column names in the query result.")
-    rows: List[List[str]] = Field(..., description="List of row values, where each row is a list of column values.")
+    result_id: str = Field(..., description="Handle of the query result in the result store.")
     error: Optional[str] = Field(None, description="Error message if the query failed.")
 
 
@@ -44,19 +50,22 @@ class VisualizationRequest(BaseModel):
 
 @agent(name="sql_and_plot_workflow")
 class SQLAndPlotWorkflow(Workflow):
-    # SQL Agent that generates and executes Clickhouse queries
+    # Executes the generated SQL; the LLM never sees or re-emits the result rows
+    clickhouse_tools: ClickHouseTools = ClickHouseTools()
+
+    # SQL Agent that generates Clickhouse queries
     sql_agent: Agent = Agent(
         model=OpenAIChat(
             id="openai-main/gpt-4o",
             api_key=os.getenv("LLM_GATEWAY_API_KEY"),
             base_url=os.getenv("LLM_GATEWAY_BASE_URL"),
         ),
-        description="You are an expert in generating and executing Clickhouse SQL queries from user queries in English.",
+        description="You are an expert in generating Clickhouse SQL queries from user queries in English.",
         instructions=[
             "First, generate an optimized and accurate ClickHouse SQL query based on the user's query. Make sure that only relevant fields are selected and queries are efficient.",
-            "Then, always execute the generated SQL query against ClickHouse using a tool call.",
-            "Return the SQL query in the format of a SQLQueryResult object.",
-            "Please verify if you made the tool call to execute the sql query against clickhouse. If not retry go back to the previous step and make the tool call.",
+            "Return only the SQL query in the format of a SQLQuery object. It is executed against ClickHouse for you.",
+            "If you are given the error of a previous attempt, fix the query accordingly.",
+            "Results are capped in size and queries that would scan too many rows are rejected, so filter on created_at and aggregate in SQL (GROUP BY, toStartOfInterval) instead of selecting raw rows.",
             "We have a Clickhouse table called request_logs which contains the requests for the calls made to an LLM.",
             "The table structure is defined below in the format of columnName: type: description:",
             "- id: String: This is the row id which is a random string. Not very useful in queries.",
@@ -80,10 +89,8 @@ class SQLAndPlotWorkflow(Workflow):
             "Syntax rule: Use toIntervalXXX(N) (e.g., toIntervalDay(30)) instead of INTERVAL N UNIT (e.g., INTERVAL 30 DAY) for interval arithmetic in ClickHouse."
             "Syntax rule: Do not end in a semicolon (;) in the query. Only end with a newline.",
         ],
-        tools=[ClickHouseTools()],
-        show_tool_calls=True,
         markdown=True,
-        response_model=SQLQueryResult,
+        response_model=SQLQuery,
         structured_outputs=True,
         # debug_mode=True,
     )
@@ -97,7 +104,8 @@ class SQLAndPlotWorkflow(Workflow):
         ),
         description="You are an expert in creating data visualizations from SQL query results.",
         instructions=[
-            "You will receive data from Clickhouse SQL queries in a tabular format with columns separated by ' | ' and rows separated by newlines.",
+            "You will receive a summary of a Clickhouse SQL query result: its row count, column types and a preview of the first rows in a tabular format with columns separated by ' | ' and rows separated by newlines.",
+            "The full result stays on the server; use the preview only to choose the columns and the plot type.",
             "The data comes from a request_logs table with columns like: id, model_name, request_type, tenant_name, username, prompt, response, input_tokens, output_tokens, latency_in_ms, cost, error_code, error_detail, etc.",
             "Choose appropriate visualizations based on the data type and relationships to show:",
             "- Time series plots for metrics over time using created_at",
@@ -133,6 +141,14 @@ class SQLAndPlotWorkflow(Workflow):
         """
         logger.info(f"Starting analysis for query: {query}")
 
+        # Repeated questions skip both agents and reuse the SQL and plot of a previous run
+        plan = plan_cache.lookup(query)
+        if plan is not None:
+            response = self._run_plan(query, plan)
+            if response is not None:
+                yield response
+                return
+
         # Step 1: Get SQL query results
         sql_result = self._execute_sql_query(query)
         if sql_result.error:
@@ -140,64 +156,97 @@ class SQLAndPlotWorkflow(Workflow):
             return
         print(f"SQL Query Result: {sql_result.column_names}")
         print(f"SQL Query Result: {sql_result.query}")
-        print(f"SQL Query Result: {sql_result.rows}")
+        print(f"SQL Query Result: {sql_result.result_id}")
         # Step 2: Generate visualization
-        yield from self._create_visualization(sql_result)
+        yield from self._create_visualization(sql_result, query)
+
+    @task(name="run cached plan")
+    def _run_plan(self, query: str, plan: QueryPlan) -> Optional[RunResponse]:
+        """Execute the SQL and plot of a cached plan; returns None if the plan no longer works."""
+        try:
+            result = self.clickhouse_tools.run_query(plan.sql)
+            if result.df.empty:
+                raise ValueError("The cached query returned no results")
+            result_id = result_store.put(result.df, result.query, truncated=result.truncated)
+            plot_path = self._plot_tools().create_plot(result_id=result_id, **plan.plot)
+            return RunResponse(
+                event="visualization_complete",
+                content=PlotResult(
+                    plot_type=plan.plot["plot_type"],
+                    plot_path=plot_path,
+                    x_col=plan.plot["x_col"],
+                    y_col=plan.plot["y_col"],
+                    title=plan.plot["title"],
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"Cached plan failed, falling back to the agents: {e}")
+            plan_cache.invalidate(query)
+            return None
+
+    def _plot_tools(self) -> Optional[PlotTools]:
+        """Find the PlotTools instance in the plot agent's tools."""
+        for tool in self.plot_agent.tools:
+            if isinstance(tool, PlotTools):
+                return tool
+        return None
 
     @task(name="execute sql query")
     def _execute_sql_query(self, query: str) -> SQLQueryResult:
-        """Execute SQL query and return results."""
+        """Generate the SQL with the SQL agent, execute it and store the typed result."""
         MAX_ATTEMPTS = 3
+        prompt = query
+        error = None
 
         for attempt in range(MAX_ATTEMPTS):
             try:
-                logger.info(f"Executing SQL query, attempt {attempt + 1}/{MAX_ATTEMPTS}")
-                sql_response: RunResponse = self.sql_agent.run(query)
+                logger.info(f"Generating SQL query, attempt {attempt + 1}/{MAX_ATTEMPTS}")
+                sql_response: RunResponse = self.sql_agent.run(prompt)
 
                 if not sql_response or not sql_response.content:
                     logger.warning(f"Attempt {attempt + 1}/{MAX_ATTEMPTS}: Empty SQL response")
                     continue
 
-                if not isinstance(sql_response.content, SQLQueryResult):
+                if not isinstance(sql_response.content, SQLQuery):
                     logger.warning(f"Attempt {attempt + 1}/{MAX_ATTEMPTS}: Invalid response type")
                     continue
 
-                return sql_response.content
+                result = self.clickhouse_tools.run_query(sql_response.content.query)
+                if result.df.empty:
+                    return SQLQueryResult(query=result.query, column_names=[], result_id="", error="No results found")
+
+                result_id = result_store.put(result.df, result.query, truncated=result.truncated)
+                return SQLQueryResult(query=result.query, column_names=result.df.columns.tolist(), result_id=result_id)
 
             except Exception as e:
-                logger.warning(f"SQL query attempt {attempt + 1}/{MAX_ATTEMPTS} failed: {str(e)}")
+                error = str(e)
+                logger.warning(f"SQL query attempt {attempt + 1}/{MAX_ATTEMPTS} failed: {error}")
+                # Let the SQL agent fix the query using the ClickHouse error
+                prompt = f"{query}\n\nThe previous query failed with this error:\n{error}"
 
         return SQLQueryResult(
-            query="", column_names=[], rows=[], error=f"Failed to execute SQL query after {MAX_ATTEMPTS} attempts"
+            query="",
+            column_names=[],
+            result_id="",
+            error=f"Failed to execute SQL query after {MAX_ATTEMPTS} attempts" + (f": {error}" if error else ""),
         )
 
     @task(name="create visualization")
-    def _create_visualization(self, sql_result: SQLQueryResult) -> Iterator[RunResponse]:
-        """Create visualization from SQL results."""
+    def _create_visualization(self, sql_result: SQLQueryResult, query: str) -> Iterator[RunResponse]:
+        """Create visualization from SQL results and cache the plan that answered the query."""
         try:
             logger.info("Generating visualization request")
 
-            # Convert SQL result into tabular format that plot_tools expects
-            # Convert columns and rows into pipe-separated format
-            formatted_data = " | ".join(sql_result.column_names) + "\n"
-            formatted_data += "\n".join([" | ".join(row) for row in sql_result.rows])
-
-            # Get visualization request from plot agent
+            # Only the schema and a preview go to the plot agent; the rows stay in the result store
             viz_response: RunResponse = self.plot_agent.run(
-                json.dumps({"query": sql_result.query, "data": formatted_data}, indent=4)
+                json.dumps({"query": sql_result.query, "result": result_store.describe(sql_result.result_id)}, indent=4)
             )
 
             if not viz_response or not viz_response.content:
                 yield RunResponse(event="visualization_error", content="Empty visualization response")
                 return
 
-            # Find the PlotTools instance in the tools
-            plot_tools = None
-            for tool in self.plot_agent.tools:
-                if isinstance(tool, PlotTools):
-                    plot_tools = tool
-                    break
-
+            plot_tools = self._plot_tools()
             if not plot_tools:
                 yield RunResponse(event="visualization_error", content="PlotTools not found in plot_agent tools")
                 return
@@ -220,13 +269,14 @@ class SQLAndPlotWorkflow(Workflow):
             logger.info(f"Creating {viz_request.plot_type} plot with x={viz_request.x_col}, y={viz_request.y_col}")
             try:
                 plot_result = plot_tools.create_plot(
-                    data=formatted_data,
+                    result_id=sql_result.result_id,
                     plot_type=viz_request.plot_type,
                     x_col=viz_request.x_col,
                     y_col=viz_request.y_col,
                     title=viz_request.title,
                     hue=viz_request.hue,
                 )
+                plan_cache.store(query, QueryPlan(sql=sql_result.query, plot=plot_spec(viz_request.model_dump())))
 
                 yield RunResponse(
                     event="visualization_complete",
@@ -8,6 +8,7 @@ from agno.utils.log import logger
 from fastapi import BackgroundTasks, FastAPI, HTTPException
 from fastapi.responses import FileResponse
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from plot_cache import thumbnail_path
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -95,9 +96,9 @@ async def get_job_status(job_id: str):
 
 
 @app.get("/plot/{job_id}")
-async def get_plot(job_id: str):
+async def get_plot(job_id: str, thumbnail: bool = False):
     """
-    Get the plot image for a completed job.
+    Get the plot image for a completed job, or its thumbnail with `thumbnail=true`.
     """
     if job_id not in results_store:
         logger.error(f"Job {job_id} not found in results store")
@@ -123,6 +124,11 @@ async def get_plot(job_id: str):
         logger.error(f"Plot file not found at path: {plot_path}")
         raise HTTPException(status_code=404, detail=f"Plot file not found at path: {plot_path}")
 
+    if thumbnail:
+        plot_path = thumbnail_path(plot_path)
+        if not os.path.exists(plot_path):
+            raise HTTPException(status_code=404, detail="No thumbnail available for this plot")
+
     return FileResponse(plot_path)
 
 
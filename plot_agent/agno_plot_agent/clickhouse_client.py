@@ -0,0 +1,230 @@
+"""
+Guarded execution of LLM-written queries against ClickHouse.
+
+Every query runs with result-size, time and memory limits enforced by ClickHouse
+query settings, and is capped to a maximum number of rows. Before running a query,
+`EXPLAIN ESTIMATE` is used to reject queries that would scan more rows than allowed,
+so a `SELECT *` over a large table cannot pull millions of rows into the API process.
+
+Limits (environment variables, 0 disables a limit):
+- CLICKHOUSE_MAX_RESULT_ROWS: rows returned to the tools (default: 100000)
+- CLICKHOUSE_MAX_RESULT_BYTES: uncompressed result size, larger results fail (default: 256 MB)
+- CLICKHOUSE_MAX_EXECUTION_TIME: seconds per query (default: 30)
+- CLICKHOUSE_MAX_MEMORY_USAGE: bytes of server memory per query (default: 4 GB)
+- CLICKHOUSE_MAX_SCAN_ROWS: rows a query may read according to EXPLAIN ESTIMATE (default: 500 million)
+- CLICKHOUSE_MAX_FRAME_BYTES: Arrow memory of the result blocks kept in the API process, larger results are
+  truncated at a block boundary (default: 512 MB)
+
+Results are streamed as Arrow record batches, one per ClickHouse block, and converted
+to a DataFrame once, so rows are never materialized as Python tuples. ClickHouse writes
+DateTime and Date columns to Arrow as epoch integers, so they are cast back to
+timestamps using the column types from `DESCRIBE` before the conversion.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+from query_cache import result_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULT_ROWS = int(os.getenv("CLICKHOUSE_MAX_RESULT_ROWS", "100000"))
+MAX_RESULT_BYTES = int(os.getenv("CLICKHOUSE_MAX_RESULT_BYTES", str(256 * 1024 * 1024)))
+MAX_EXECUTION_TIME = int(os.getenv("CLICKHOUSE_MAX_EXECUTION_TIME", "30"))
+MAX_MEMORY_USAGE = int(os.getenv("CLICKHOUSE_MAX_MEMORY_USAGE", str(4 * 1024 * 1024 * 1024)))
+MAX_SCAN_ROWS = int(os.getenv("CLICKHOUSE_MAX_SCAN_ROWS", "500000000"))
+MAX_FRAME_BYTES = int(os.getenv("CLICKHOUSE_MAX_FRAME_BYTES", str(512 * 1024 * 1024)))
+
+# Queries that can be wrapped in a subquery to cap their rows
+SELECT_PATTERN = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+# Type wrappers that do not change the Arrow representation of a column
+TYPE_WRAPPER = re.compile(r"^(?:Nullable|LowCardinality)\((.*)\)$")
+# DateTime with an optional time zone, e.g. DateTime('Europe/Berlin')
+DATETIME_TYPE = re.compile(r"^DateTime(?:\(\s*'([^']*)'\s*\))?$")
+
+
+class QueryRejectedError(ValueError):
+    """Raised when a query would scan more rows than CLICKHOUSE_MAX_SCAN_ROWS."""
+
+
+@dataclass
+class QueryResult:
+    """A query result with the metadata the agent needs to interpret it.
+
+    Attributes:
+        df (pd.DataFrame): The result rows
+        query (str): The query that was executed
+        truncated (bool): Whether more rows were available than were returned
+        row_cap (int): Maximum number of rows that could be returned
+    """
+
+    df: pd.DataFrame
+    query: str
+    truncated: bool = False
+    row_cap: int = 0
+
+
+def clean_query(query: str) -> str:
+    """Strip whitespace and trailing semicolons, which ClickHouse rejects in subqueries."""
+    return query.strip().rstrip(";").strip()
+
+
+def row_cap(limit: Optional[int] = None) -> int:
+    """Number of rows a query may return: the requested limit, bounded by CLICKHOUSE_MAX_RESULT_ROWS."""
+    caps = [cap for cap in (limit, MAX_RESULT_ROWS) if cap and cap > 0]
+    return min(caps) if caps else 0
+
+
+def query_settings(cap: int = 0) -> dict:
+    """ClickHouse settings enforcing the size, time and memory limits of a query.
+
+    Rows of SELECT queries are capped with an outer LIMIT instead: `max_result_rows` also
+    applies to subqueries, where truncating would silently change the result. `cap` is only
+    used for other statements.
+    """
+    settings = {}
+    if cap:
+        # One extra row tells whether the result was truncated
+        settings["max_result_rows"] = cap + 1
+        settings["result_overflow_mode"] = "break"
+    if MAX_RESULT_BYTES:
+        settings["max_result_bytes"] = MAX_RESULT_BYTES
+    if MAX_EXECUTION_TIME:
+        settings["max_execution_time"] = MAX_EXECUTION_TIME
+    if MAX_MEMORY_USAGE:
+        settings["max_memory_usage"] = MAX_MEMORY_USAGE
+    return settings
+
+
+def estimate_rows(client, query: str) -> Optional[int]:
+    """Rows the query would read according to EXPLAIN ESTIMATE, or None if it cannot be estimated."""
+    try:
+        result = client.query(f"EXPLAIN ESTIMATE {query}")
+        if "rows" not in result.column_names:
+            return None
+        index = result.column_names.index("rows")
+        return sum(int(row[index]) for row in result.result_rows)
+    except Exception as e:
+        logger.info(f"Could not estimate query size: {e}")
+        return None
+
+
+def check_scan_size(client, query: str):
+    """Reject queries that would scan more than CLICKHOUSE_MAX_SCAN_ROWS rows."""
+    if not MAX_SCAN_ROWS:
+        return
+    estimated = estimate_rows(client, query)
+    if estimated is not None and estimated > MAX_SCAN_ROWS:
+        raise QueryRejectedError(
+            f"Query rejected: it would read about {estimated:,} rows, more than the {MAX_SCAN_ROWS:,} allowed. "
+            "Add a filter on created_at and aggregate in SQL (GROUP BY, toStartOfInterval) instead of selecting raw rows."
+        )
+
+
+def column_types(client, query: str) -> Dict[str, str]:
+    """ClickHouse types of the result columns of a query, by name, or {} if they cannot be described."""
+    try:
+        result = client.query(f"DESCRIBE TABLE (\n{query}\n)")
+        return {row[0]: row[1] for row in result.result_rows}
+    except Exception as e:
+        logger.info(f"Could not describe query result: {e}")
+        return {}
+
+
+def to_frame(table: pa.Table, types: Dict[str, str]) -> pd.DataFrame:
+    """Convert an Arrow result to a DataFrame, with DateTime and Date columns as datetime64.
+
+    ClickHouse writes DateTime as UInt32 epoch seconds and Date as UInt16 epoch days in Arrow
+    (DateTime64 and Date32 already have Arrow timestamp and date types). A DateTime column
+    declared with a time zone keeps it; others are naive UTC.
+    """
+    for index, field in enumerate(table.schema):
+        column_type = types.get(field.name, "")
+        while TYPE_WRAPPER.match(column_type):
+            column_type = TYPE_WRAPPER.match(column_type).group(1)
+        datetime_match = DATETIME_TYPE.match(column_type)
+        if datetime_match:
+            integer_type, target = pa.int64(), pa.timestamp("s", tz=datetime_match.group(1) or None)
+        elif column_type == "Date":
+            integer_type, target = pa.int32(), pa.date32()
+        else:
+            continue
+        if pa.types.is_integer(field.type):
+            table = table.set_column(index, field.name, table.column(index).cast(integer_type).cast(target))
+    return table.to_pandas(date_as_object=False)
+
+
+def fetch_frame(client, query: str, settings: dict, cap: int = 0) -> Tuple[pd.DataFrame, bool]:
+    """Stream a query as Arrow record batches into a DataFrame, bounded block by block.
+
+    Reading stops once more than `cap` rows or CLICKHOUSE_MAX_FRAME_BYTES bytes have been received,
+    so an oversized result never has to be held in full.
+
+    Returns:
+        Tuple[pd.DataFrame, bool]: The frame and whether reading stopped early because of the memory bound
+    """
+    types = column_types(client, query)
+    batches: List[pa.RecordBatch] = []
+    rows = 0
+    size = 0
+    truncated = False
+    with client.query_arrow_stream(query, settings=settings, use_strings=True) as stream:
+        for batch in stream:
+            batches.append(batch)
+            rows += batch.num_rows
+            size += batch.nbytes
+            if cap and rows > cap:
+                break
+            if MAX_FRAME_BYTES and size > MAX_FRAME_BYTES:
+                logger.warning(f"Query result truncated at {rows} rows: more than {MAX_FRAME_BYTES} bytes")
+                truncated = True
+                break
+    if not batches:
+        return pd.DataFrame(), False
+    return to_frame(pa.Table.from_batches(batches), types), truncated
+
+
+def run_query(client, query: str, limit: Optional[int] = None, use_cache: bool = True) -> QueryResult:
+    """Execute a query with the configured guardrails, reusing a cached result when possible.
+
+    Args:
+        client: ClickHouse client
+        query (str): The SQL query
+        limit (Optional[int]): Maximum number of rows to return, bounded by CLICKHOUSE_MAX_RESULT_ROWS
+        use_cache (bool): Whether to use the shared query result cache
+
+    Returns:
+        QueryResult: The result, truncated to the row cap
+    """
+    query = clean_query(query)
+    cap = row_cap(limit)
+
+    cache_key = result_cache.key(query, getattr(client, "database", None), cap)
+    if use_cache:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Query result served from cache")
+            return cached
+
+    check_scan_size(client, query)
+    if cap and SELECT_PATTERN.match(query):
+        # One extra row tells whether the result was truncated
+        df, truncated = fetch_frame(client, f"SELECT * FROM (\n{query}\n) LIMIT {cap + 1}", query_settings(), cap)
+    else:
+        df, truncated = fetch_frame(client, query, query_settings(cap), cap)
+
+    if cap and len(df) > cap:
+        truncated = True
+        df = df.head(cap)
+        logger.warning(f"Query result truncated to {cap} rows")
+
+    result = QueryResult(df=df, query=query, truncated=truncated, row_cap=cap)
+    if use_cache:
+        result_cache.set(cache_key, result)
+    return result
@@ -1,11 +1,12 @@
-import os
 from typing import Optional
 
 from agno.agent import Agent
 from agno.tools import Toolkit
 from agno.utils.log import logger
-from clickhouse_connect import get_client
+from clickhouse_client import QueryResult, run_query
+from clickhouse_pool import clickhouse_pool
 from dotenv import load_dotenv
+from result_store import result_store
 
 
 class ClickHouseTools(Toolkit):
@@ -16,56 +17,35 @@ class ClickHouseTools(Toolkit):
         # Load environment variables
         load_dotenv()
 
-        self.client = get_client(
-            host=os.getenv("CLICKHOUSE_HOST"),
-            port=int(os.getenv("CLICKHOUSE_PORT", "443")),
-            username=os.getenv("CLICKHOUSE_USER"),
-            password=os.getenv("CLICKHOUSE_PASSWORD"),
-            database=os.getenv("CLICKHOUSE_DATABASE", "default"),
-        )
+    def run_query(self, query: str, limit: Optional[int] = None) -> QueryResult:
+        """Execute a query with the result-size guardrails and return the typed result (not exposed to the LLM)."""
+        logger.info(f"Executing ClickHouse query: {query}")
+        # Clients come from a pool shared by all workflow runs
+        with clickhouse_pool.connection() as client:
+            result = run_query(client, query, limit=limit)
+        logger.info(f"Query returned {len(result.df)} rows with columns: {result.df.columns.tolist()}")
+        return result
 
     def execute_query(self, query: str, limit: Optional[int] = None) -> str:
         """
-        Use this function to execute a ClickHouse query and return the results from the database back so that it can be used for plotting.
+        Use this function to execute a ClickHouse query. The result is kept on the server so that it can be used for plotting.
+        Results are capped at CLICKHOUSE_MAX_RESULT_ROWS rows and queries scanning too much data are rejected.
 
         Args:
             query (str): The SQL query to execute
             limit (Optional[int]): Maximum number of rows to return
         Returns:
-            str: The query results as a formatted string
+            str: The result_id of the stored result, its row count, column types and a preview of the first rows
 
         """
         try:
-            logger.info(f"Executing ClickHouse query: {query}")
+            result = self.run_query(query, limit=limit)
 
-            result = self.client.query(query)
-
-            if not result.result_rows:
+            if result.df.empty:
                 return "No results found"
 
-            # Format the results as a string
-            output = []
-            # Add column headers
-            headers = [col[0] for col in result.column_names]
-            logger.info(f"Query returned columns: {headers}")
-            output.append(" | ".join(headers))
-
-            # Add separator line
-            output.append("-" * len(" | ".join(headers)))
-
-            # Add rows
-            for row in result.result_rows:
-                formatted_row = []
-                for cell in row:
-                    if cell is None:
-                        formatted_row.append("NULL")
-                    else:
-                        formatted_row.append(str(cell))
-                output.append(" | ".join(formatted_row))
-
-            result_str = "\n".join(output)
-            logger.info(f"Query returned {len(result.result_rows)} rows")
-            return result_str
+            result_id = result_store.put(result.df, result.query, truncated=result.truncated)
+            return result_store.describe(result_id)
 
         except Exception as e:
             logger.warning(f"Failed to execute ClickHouse query: {e}")
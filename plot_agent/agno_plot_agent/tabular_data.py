@@ -0,0 +1,158 @@
+"""
+Parsing of ' | ' separated tables (as written by LLMs or `result_store.format_table`) into typed DataFrames.
+
+The whole table is parsed in one `pd.read_csv` call: separator lines and the spaces
+around separators are removed from the full text beforehand, so no Python code runs
+per row. When the column types are known (ClickHouse types such as UInt64, Float32 or
+DateTime64(3), or pandas dtypes), the CSV parser builds columns of those types directly.
+
+Other columns are typed by the CSV parser: numeric if every value is a number, text
+otherwise. Text columns whose name mentions a time or date are parsed as datetimes if
+every value parses. Cost columns are always numeric and made non-negative.
+"""
+
+import io
+import logging
+import re
+from typing import Dict, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Values that ClickHouse and `format_table` write for NULL
+NULL_VALUES = ["NULL", "\\N", "None", "nan", "NaN", ""]
+
+# Separator lines such as "-----", "|---|---|" or "+---+---+"
+SEPARATOR_LINE = re.compile(r"^[ \t|+:=-]*-[ \t|+:=-]*(?:\n|$)", re.MULTILINE)
+# Spaces around cell separators and at the start or end of lines
+PIPE_PADDING = re.compile(r"[ \t]*\|[ \t]*")
+LINE_PADDING = re.compile(r"^[ \t]+|[ \t]+$", re.MULTILINE)
+
+# Type wrappers that do not change how values are written
+TYPE_WRAPPER = re.compile(r"^(?:Nullable|LowCardinality)\((.*)\)$")
+INTEGER_TYPE = re.compile(r"^(U?)Int(8|16|32|64)$")
+FLOAT_TYPE = re.compile(r"^Float(32|64)$|^Decimal|^U?Int(128|256)$")
+DATETIME_TYPE = re.compile(r"^(?:Date|Date32|DateTime|DateTime64)\b")
+
+
+def column_kind(column_type: str) -> Optional[str]:
+    """The pandas dtype ("UInt64", "float32", "datetime64", "bool", "str", ...) of a ClickHouse or pandas type.
+
+    Integers map to the nullable pandas integer types, so NULLs do not turn them into floats.
+    Returns None for types that are not recognized, whose columns are inferred instead.
+    """
+    name = column_type.strip()
+    while True:
+        match = TYPE_WRAPPER.match(name)
+        if not match:
+            break
+        name = match.group(1).strip()
+
+    match = INTEGER_TYPE.match(name)
+    if match:
+        return f"{'U' if match.group(1) else ''}Int{match.group(2)}"
+    if FLOAT_TYPE.match(name):
+        return "float32" if name == "Float32" else "float64"
+    if DATETIME_TYPE.match(name):
+        return "datetime64"
+    if name == "Bool":
+        return "bool"
+    if name.startswith(("String", "FixedString", "Enum", "UUID", "IPv4", "IPv6")):
+        return "str"
+
+    # pandas dtypes, as listed by `result_store.describe`
+    try:
+        dtype = pd.api.types.pandas_dtype(name)
+    except TypeError:
+        return None
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime64"
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return str(dtype)
+    return None
+
+
+def _convert(values: pd.Series, kind: str) -> pd.Series:
+    if kind == "datetime64":
+        return pd.to_datetime(values, format="ISO8601")
+    if kind == "bool":
+        return values.str.lower().map({"true": True, "false": False, "1": True, "0": False}).astype("boolean")
+    return values
+
+
+def _infer(values: pd.Series, name: str) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    if "cost" in name.lower():
+        return pd.to_numeric(values, errors="coerce")
+    if "time" in name.lower() or "date" in name.lower():
+        dates = pd.to_datetime(values, errors="coerce", format="mixed")
+        if dates.notna().sum() == values.notna().sum():
+            return dates
+    return values
+
+
+def parse_tabular_data(data: str, column_types: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Convert tabular string data to a pandas DataFrame.
+
+    Args:
+        data (str): Rows separated by newlines and cells by '|' (or by whitespace if the header has no '|')
+        column_types (Optional[Dict[str, str]]): ClickHouse types (or pandas dtypes) of the columns, by name
+
+    Returns:
+        pd.DataFrame: The typed frame
+    """
+    try:
+        if not data or not data.strip():
+            logger.warning("Empty data provided for parsing")
+            return pd.DataFrame()
+
+        text = SEPARATOR_LINE.sub("", data.strip())
+        if "\n " in text or " \n" in text or "\t" in text:
+            text = LINE_PADDING.sub("", text)
+        header = text.partition("\n")[0]
+        if "|" in header:
+            # Plain replacement handles the usual ' | ' separators; the regular expression any other padding
+            text = text.replace(" | ", "|")
+            if " |" in text or "| " in text:
+                text = PIPE_PADDING.sub("|", text)
+            sep = "|"
+            names = text.partition("\n")[0].split("|")
+        else:
+            sep = r"\s+"
+            names = header.split()
+        # Leading and trailing '|' (markdown tables) produce unnamed empty columns
+        usecols = [i for i, name in enumerate(names) if name]
+        names = [name if name else f"_{i}" for i, name in enumerate(names)]
+
+        kinds = {name: column_kind(column_type) for name, column_type in (column_types or {}).items()}
+        # Datetimes and booleans are read as text and converted below; other columns are typed by the parser
+        dtypes = {name: kind if kind not in ("datetime64", "bool") else "str" for name, kind in kinds.items() if kind}
+        df = pd.read_csv(
+            io.StringIO(text),
+            sep=sep,
+            header=None,
+            skiprows=1,
+            names=names,
+            usecols=usecols,
+            dtype=dtypes,
+            na_values=NULL_VALUES,
+            keep_default_na=False,
+            on_bad_lines="warn",
+        )
+
+        for col in df.columns:
+            kind = kinds.get(col)
+            df[col] = _convert(df[col], kind) if kind else _infer(df[col], col)
+            # Special handling for cost columns to ensure positive values
+            if "cost" in col.lower() and pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = df[col].abs()
+
+        logger.debug(f"Parsed tabular data into DataFrame with shape {df.shape}: {df.dtypes.to_dict()}")
+        return df
+    except Exception as e:
+        logger.warning(f"Failed to parse tabular data: {e}")
+        raise ValueError(f"Failed to parse tabular data: {e}")
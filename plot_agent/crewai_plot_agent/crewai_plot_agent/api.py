@@ -4,7 +4,9 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 import uvicorn
-from crewai_plot_agent.crew import CrewaiPlotAgent
+from crewai_plot_agent.crew import CrewaiPlotAgent, run_plan
+from crewai_plot_agent.tools.plan_cache import plan_cache
+from crewai_plot_agent.tools.plot_cache import thumbnail_path
 from fastapi import BackgroundTasks, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
@@ -57,6 +59,23 @@ async def process_query(job_id: str, query: str):
             {"event": "processing_start", "content": "Starting query processing with CrewAI agents"}
         )
 
+        # Repeated questions skip the crew and reuse the SQL and plot of a previous job
+        plan = plan_cache.lookup(query)
+        if plan is not None:
+            try:
+                plot_path = run_plan(plan)
+                results_store[job_id].update(
+                    {
+                        "status": "completed",
+                        "events": results_store[job_id]["events"] + [{"event": "plan_cache_hit", "content": plan.sql}],
+                        "plot_path": plot_path,
+                    }
+                )
+                return
+            except Exception as e:
+                print(f"Cached plan failed, falling back to the crew: {e}")
+                plan_cache.invalidate(query)
+
         # Prepare inputs for CrewAI
         inputs = {"topic": query, "current_year": str(datetime.now().year)}
 
@@ -79,6 +98,10 @@ async def process_query(job_id: str, query: str):
 
         # Check if plot was generated
         if os.path.exists(plot_path):
+            successful_plan = plan_cache.plan_for_plot(plot_path)
+            if successful_plan is not None:
+                plan_cache.store(query, successful_plan)
+
             results_store[job_id].update(
                 {
                     "status": "completed",
@@ -146,8 +169,8 @@ async def get_status(job_id: str):
 
 
 @app.get("/plot/{job_id}")
-async def get_plot(job_id: str):
-    """Get the plot image for a completed job"""
+async def get_plot(job_id: str, thumbnail: bool = False):
+    """Get the plot image for a completed job, or its thumbnail with `thumbnail=true`"""
     print(results_store)
     if job_id not in results_store:
         print(f"Job {job_id} not found in results store")
@@ -173,6 +196,11 @@ async def get_plot(job_id: str):
         print(f"Plot file not found at path: {plot_path}")
         raise HTTPException(status_code=404, detail=f"Plot file not found at path: {plot_path}")
 
+    if thumbnail:
+        plot_path = thumbnail_path(plot_path)
+        if not os.path.exists(plot_path):
+            raise HTTPException(status_code=404, detail="No thumbnail available for this plot")
+
     return FileResponse(plot_path)
 
 
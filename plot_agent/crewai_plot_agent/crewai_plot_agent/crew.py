@@ -2,8 +2,12 @@ from typing import Any, Dict, List, Optional
 
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
+from crewai_plot_agent.tools.clickhouse_client import run_query
+from crewai_plot_agent.tools.clickhouse_pool import clickhouse_pool
 from crewai_plot_agent.tools.clickhouse_tool import ClickHouseTool
+from crewai_plot_agent.tools.plan_cache import QueryPlan
 from crewai_plot_agent.tools.plot_tool import PlotTools
+from crewai_plot_agent.tools.result_store import result_store
 from pydantic import BaseModel, Field
 
 # If you want to run a snippet of code before or after the crew starts,
@@ -17,7 +21,7 @@ Traceloop.init(app_name="crewai")
 class SQLQueryResult(BaseModel):
     query: str = Field(..., description="The SQL query that was executed.")
     column_names: List[str] = Field(..., description="List of column names in the query result.")
-    rows: List[List[str]] = Field(..., description="List of row values, where each row is a list of column values.")
+    result_id: str = Field(..., description="The result_id returned by the query tool for the stored result.")
     error: Optional[str] = Field(None, description="Error message if the query failed.")
 
 
@@ -101,3 +105,17 @@ class CrewaiPlotAgent:
             # output_pydantic=True,
             # process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
         )
+
+
+def run_plan(plan: QueryPlan) -> str:
+    """Answer a question from a cached plan without the crew: run its SQL and render its plot.
+
+    Returns:
+        str: Path of the created plot
+    """
+    with clickhouse_pool.connection() as client:
+        result = run_query(client, plan.sql)
+    if result.df.empty:
+        raise ValueError("The cached query returned no results")
+    result_id = result_store.put(result.df, result.query, truncated=result.truncated)
+    return PlotTools()._run(result_id=result_id, **plan.plot)
@@ -0,0 +1,157 @@
+"""
+Bounded, thread-safe pool of ClickHouse clients shared by all jobs of the API.
+
+A clickhouse-connect client must not run concurrent queries, and opening a client
+per job costs a connection handshake and server version check. Jobs instead borrow
+a client for the duration of their queries:
+
+    with clickhouse_pool.connection() as client:
+        run_query(client, query)
+
+Each borrow gets a fresh ClickHouse session id, so session state (SET statements,
+temporary tables) never leaks between jobs. Clients idle for longer than the health
+check interval are pinged before being handed out, and clients that failed with a
+connection error are discarded and replaced.
+
+Configuration (environment variables):
+- CLICKHOUSE_POOL_SIZE: maximum number of clients (default: 8)
+- CLICKHOUSE_POOL_TIMEOUT_SECONDS: how long a job waits for a free client (default: 30)
+- CLICKHOUSE_POOL_HEALTH_CHECK_SECONDS: idle time after which a client is pinged before use (default: 30)
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Iterator, Tuple
+
+from clickhouse_connect import get_client
+from clickhouse_connect.driver.exceptions import OperationalError
+
+logger = logging.getLogger(__name__)
+
+CLICKHOUSE_POOL_SIZE = int(os.getenv("CLICKHOUSE_POOL_SIZE", "8"))
+CLICKHOUSE_POOL_TIMEOUT_SECONDS = float(os.getenv("CLICKHOUSE_POOL_TIMEOUT_SECONDS", "30"))
+CLICKHOUSE_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("CLICKHOUSE_POOL_HEALTH_CHECK_SECONDS", "30"))
+
+
+def connect():
+    """Open a ClickHouse client from the CLICKHOUSE_* environment variables."""
+    return get_client(
+        host=os.getenv("CLICKHOUSE_HOST"),
+        port=int(os.getenv("CLICKHOUSE_PORT", "443")),
+        username=os.getenv("CLICKHOUSE_USER"),
+        password=os.getenv("CLICKHOUSE_PASSWORD"),
+        database=os.getenv("CLICKHOUSE_DATABASE", "default"),
+    )
+
+
+class ClickHousePool:
+    """Thread-safe pool of at most `max_size` ClickHouse clients, opened lazily.
+
+    Args:
+        max_size (int): Maximum number of clients
+        timeout_seconds (float): How long `connection()` waits for a free client before raising TimeoutError
+        health_check_seconds (float): Idle time after which a client is pinged before being handed out
+    """
+
+    def __init__(
+        self,
+        max_size: int = CLICKHOUSE_POOL_SIZE,
+        timeout_seconds: float = CLICKHOUSE_POOL_TIMEOUT_SECONDS,
+        health_check_seconds: float = CLICKHOUSE_POOL_HEALTH_CHECK_SECONDS,
+    ):
+        self.max_size = max(1, max_size)
+        self.timeout_seconds = timeout_seconds
+        self.health_check_seconds = health_check_seconds
+        # Idle clients with the time they were last returned; the most recently used are reused first
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a client for the duration of the block, with its own ClickHouse session."""
+        client = self._acquire()
+        healthy = True
+        try:
+            client.set_client_setting("session_id", str(uuid.uuid4()))
+            yield client
+        except OperationalError:
+            # Connection-level failure: the client is replaced rather than reused
+            healthy = False
+            raise
+        finally:
+            self._release(client, healthy)
+
+    def close(self):
+        """Close all idle clients, e.g. on shutdown."""
+        with self._condition:
+            while self._idle:
+                client, _ = self._idle.pop()
+                self._size -= 1
+                self._close(client)
+            self._condition.notify_all()
+
+    def _acquire(self) -> Any:
+        deadline = time.monotonic() + self.timeout_seconds
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No ClickHouse connection available after {self.timeout_seconds}s")
+                    self._condition.wait(remaining)
+                if self._idle:
+                    client, last_used = self._idle.pop()
+                else:
+                    client, last_used = None, 0.0
+                    self._size += 1
+
+            if client is None:
+                try:
+                    return connect()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+
+            if time.monotonic() - last_used <= self.health_check_seconds or self._ping(client):
+                return client
+            logger.info("Discarding unhealthy ClickHouse connection")
+            self._discard(client)
+
+    def _release(self, client: Any, healthy: bool = True):
+        if not healthy:
+            self._discard(client)
+            return
+        with self._condition:
+            self._idle.append((client, time.monotonic()))
+            self._condition.notify()
+
+    def _discard(self, client: Any):
+        self._close(client)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _ping(client: Any) -> bool:
+        try:
+            return bool(client.ping())
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(client: Any):
+        try:
+            client.close()
+        except Exception as e:
+            logger.debug(f"Failed to close ClickHouse connection: {e}")
+
+
+clickhouse_pool = ClickHousePool()
@@ -1,10 +1,11 @@
-import os
-from typing import Any, Optional, Type
+from typing import Optional, Type
 
-from clickhouse_connect import get_client
 from crewai.tools import BaseTool
+from crewai_plot_agent.tools.clickhouse_client import run_query
+from crewai_plot_agent.tools.clickhouse_pool import clickhouse_pool
+from crewai_plot_agent.tools.result_store import result_store
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, PrivateAttr
+from pydantic import BaseModel, Field
 
 # Load environment variables
 load_dotenv()
@@ -19,44 +20,24 @@ class ClickHouseQueryInput(BaseModel):
 
 class ClickHouseTool(BaseTool):
     name: str = "ClickHouse Query Executor"
-    description: str = "Executes a ClickHouse query and returns the formatted results."
+    description: str = (
+        "Executes a ClickHouse query and keeps the result on the server. Returns a result_id to pass to the "
+        "Plot Generator, the row count, the column types and a preview of the first rows. Results are capped in "
+        "size and queries that would scan too many rows are rejected."
+    )
     args_schema: Type[BaseModel] = ClickHouseQueryInput
-    _client: Any = PrivateAttr()
-
-    def __init__(self):
-        super().__init__()
-        print(
-            "Initializing ClickHouseTool",
-            os.getenv("CLICKHOUSE_HOST"),
-            os.getenv("CLICKHOUSE_PORT"),
-            os.getenv("CLICKHOUSE_USER"),
-            os.getenv("CLICKHOUSE_PASSWORD"),
-            os.getenv("CLICKHOUSE_DATABASE"),
-        )
-        self._client = get_client(
-            host=os.getenv("CLICKHOUSE_HOST"),
-            port=int(os.getenv("CLICKHOUSE_PORT", "443")),
-            username=os.getenv("CLICKHOUSE_USER"),
-            password=os.getenv("CLICKHOUSE_PASSWORD"),
-            database=os.getenv("CLICKHOUSE_DATABASE", "default"),
-        )
 
     def _run(self, query: str, limit: Optional[int] = None) -> str:
-        """Executes a ClickHouse query and returns formatted results."""
+        """Executes a ClickHouse query, stores the result and returns its summary."""
         try:
-            result = self._client.query(query)
+            # Clients come from a pool shared by all crews, which are rebuilt per request
+            with clickhouse_pool.connection() as client:
+                result = run_query(client, query, limit=limit)
 
-            if not result.result_rows:
+            if result.df.empty:
                 return "No results found."
 
-            # Format the results
-            headers = [col[0] for col in result.column_names]
-            output = [" | ".join(headers), "-" * len(" | ".join(headers))]
-
-            for row in result.result_rows:
-                formatted_row = ["NULL" if cell is None else str(cell) for cell in row]
-                output.append(" | ".join(formatted_row))
-
-            return "\n".join(output)
+            result_id = result_store.put(result.df, result.query, truncated=result.truncated)
+            return result_store.describe(result_id)
         except Exception as e:
             return f"Error executing ClickHouse query: {str(e)}"
@@ -0,0 +1,199 @@
+"""
+Cache mapping natural-language questions to the SQL and plot that answered them.
+
+When a job succeeds, its question is stored with the SQL query and the create_plot
+arguments that produced the plot. A repeated question skips the agent: the cached
+SQL is executed and the plot rendered directly, which takes a common query from an
+LLM round-trip to well under a second.
+
+Questions are matched exactly after normalization (case, whitespace, trailing
+punctuation), then, if `PLAN_CACHE_EMBEDDING_MODEL` is set, by cosine similarity of
+their embeddings above `PLAN_CACHE_SIMILARITY_THRESHOLD`. A similar question only
+matches if it contains the same numbers, so "last 7 days" never reuses the plan of
+"last 30 days".
+
+Configuration (environment variables):
+- PLAN_CACHE_TTL_SECONDS: how long plans are reused, 0 disables the cache (default: 86400)
+- PLAN_CACHE_MAX_ENTRIES: maximum number of cached plans (default: 1000)
+- PLAN_CACHE_EMBEDDING_MODEL: embedding model served by the LLM gateway, e.g. openai-main/text-embedding-3-small
+- PLAN_CACHE_SIMILARITY_THRESHOLD: minimum cosine similarity of a semantic match (default: 0.95)
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", "86400"))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1000"))
+PLAN_CACHE_EMBEDDING_MODEL = os.getenv("PLAN_CACHE_EMBEDDING_MODEL", "")
+PLAN_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("PLAN_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+
+# create_plot arguments that describe the visualization (not the data or the output file)
+PLOT_SPEC_KEYS = ("plot_type", "x_col", "y_col", "title", "hue")
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip(" ?.!")
+
+
+def plot_spec(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep the create_plot arguments that describe the visualization."""
+    return {key: arguments.get(key) for key in PLOT_SPEC_KEYS}
+
+
+@dataclass
+class QueryPlan:
+    """A reusable answer to a question.
+
+    Attributes:
+        sql (str): The SQL query that produced the plotted data
+        plot (Dict[str, Any]): create_plot arguments (plot_type, x_col, y_col, title, hue)
+    """
+
+    sql: str
+    plot: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Entry:
+    plan: QueryPlan
+    created: float
+    numbers: Tuple[str, ...]
+    embedding: Optional[np.ndarray] = None
+
+
+class PlanCache:
+    """Thread-safe, TTL and size bounded cache of question -> QueryPlan.
+
+    Args:
+        ttl_seconds (float): Time after which a plan is no longer reused; 0 disables the cache
+        max_entries (int): Maximum number of plans; the least recently used are evicted first
+        embedding_model (str): Embedding model for semantic matches; empty for exact matches only
+        similarity_threshold (float): Minimum cosine similarity of a semantic match
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = PLAN_CACHE_TTL_SECONDS,
+        max_entries: int = PLAN_CACHE_MAX_ENTRIES,
+        embedding_model: str = PLAN_CACHE_EMBEDDING_MODEL,
+        similarity_threshold: float = PLAN_CACHE_SIMILARITY_THRESHOLD,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Plans of rendered plots, keyed by plot path, until their job decides to cache them
+        self._rendered: "OrderedDict[str, QueryPlan]" = OrderedDict()
+        self._embedding_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def lookup(self, question: str) -> Optional[QueryPlan]:
+        """Return the plan of the same (or a sufficiently similar) question, if any."""
+        if not self.enabled:
+            return None
+        key = normalize_question(question)
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                logger.info(f"Plan cache hit for question: {question}")
+                return entry.plan
+            if not self.embedding_model or not self._entries:
+                return None
+
+        embedding = self._embed(key)
+        if embedding is None:
+            return None
+        numbers = tuple(NUMBER_PATTERN.findall(key))
+        with self._lock:
+            candidates = [
+                (candidate_key, entry)
+                for candidate_key, entry in self._entries.items()
+                if entry.embedding is not None and entry.numbers == numbers
+            ]
+            if not candidates:
+                return None
+            similarities = np.stack([entry.embedding for _, entry in candidates]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            candidate_key, entry = candidates[best]
+            self._entries.move_to_end(candidate_key)
+        logger.info(f"Plan cache semantic hit ({similarities[best]:.3f}) for question: {question}")
+        return entry.plan
+
+    def store(self, question: str, plan: QueryPlan):
+        if not self.enabled:
+            return
+        key = normalize_question(question)
+        embedding = self._embed(key) if self.embedding_model else None
+        with self._lock:
+            self._entries[key] = _Entry(
+                plan=plan,
+                created=time.monotonic(),
+                numbers=tuple(NUMBER_PATTERN.findall(key)),
+                embedding=embedding,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, question: str):
+        """Forget the plan of a question, e.g. after it failed to execute."""
+        with self._lock:
+            self._entries.pop(normalize_question(question), None)
+
+    def record_plot(self, plot_path: str, sql: str, arguments: Dict[str, Any]):
+        """Remember the SQL and create_plot arguments behind a rendered plot."""
+        with self._lock:
+            self._rendered[plot_path] = QueryPlan(sql=sql, plot=plot_spec(arguments))
+            while len(self._rendered) > self.max_entries:
+                self._rendered.popitem(last=False)
+
+    def plan_for_plot(self, plot_path: str) -> Optional[QueryPlan]:
+        """Pop the plan recorded for a rendered plot, to cache it under the job's question."""
+        with self._lock:
+            return self._rendered.pop(plot_path, None)
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            if self._embedding_client is None:
+                from openai import OpenAI
+
+                self._embedding_client = OpenAI(
+                    api_key=os.getenv("LLM_GATEWAY_API_KEY") or None,
+                    base_url=os.getenv("LLM_GATEWAY_BASE_URL") or None,
+                )
+            response = self._embedding_client.embeddings.create(model=self.embedding_model, input=[text])
+            vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+            return vector / (np.linalg.norm(vector) or 1.0)
+        except Exception as e:
+            logger.warning(f"Failed to embed question for the plan cache: {e}")
+            return None
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired: List[str] = [key for key, entry in self._entries.items() if now - entry.created > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+
+plan_cache = PlanCache()
@@ -0,0 +1,246 @@
+"""
+Reduction of large plot inputs before rendering.
+
+Seaborn renders every row it is given, so a line plot of a million points or a
+histogram over raw rows is slow to draw and unreadable. Before rendering:
+
+- Histograms with more rows than the point budget are pre-binned into counts. If the
+  stored result was truncated, the binning runs in ClickHouse over the full query.
+- Line plots with series longer than the point budget are downsampled per series with
+  LTTB (largest triangle three buckets) or min-max bucketing. If the stored result was
+  truncated and x is a timestamp, the series are first aggregated in ClickHouse with
+  `toStartOfInterval`, so the plot covers the whole time range.
+
+The input frame is never modified: stored and cached results are shared between jobs.
+
+Configuration (environment variables):
+- PLOT_POINT_BUDGET: maximum number of points per series (and rows of a histogram) that are rendered (default: 2000)
+- PLOT_DOWNSAMPLE_METHOD: `lttb` or `minmax` (default: lttb)
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from crewai_plot_agent.tools.clickhouse_client import run_query
+from crewai_plot_agent.tools.clickhouse_pool import clickhouse_pool
+
+logger = logging.getLogger(__name__)
+
+PLOT_POINT_BUDGET = int(os.getenv("PLOT_POINT_BUDGET", "2000"))
+PLOT_DOWNSAMPLE_METHOD = os.getenv("PLOT_DOWNSAMPLE_METHOD", "lttb")
+
+HISTOGRAM_BINS = 30
+COUNT_COLUMN = "bin_count"
+
+
+@dataclass
+class PlotInput:
+    """The frame to render and how to interpret it.
+
+    Attributes:
+        df (pd.DataFrame): The (possibly reduced) data
+        weights (Optional[str]): Column with per-row counts when `df` holds pre-binned histogram data
+        bins (Union[int, List[float]]): Number of histogram bins or the bin edges of pre-binned data
+    """
+
+    df: pd.DataFrame
+    weights: Optional[str] = None
+    bins: Union[int, List[float]] = HISTOGRAM_BINS
+
+
+def quote_identifier(name: str) -> str:
+    return "`" + name.replace("`", "\\`") + "`"
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points kept by the largest-triangle-three-buckets algorithm.
+
+    x must be sorted. The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously kept point
+    and the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the minimum and maximum of each of threshold / 2 buckets, plus the first and last point."""
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+    kept = {0, n - 1}
+    for bucket in np.array_split(np.arange(n), threshold // 2):
+        values = y[bucket]
+        kept.add(int(bucket[np.argmin(values)]))
+        kept.add(int(bucket[np.argmax(values)]))
+    return np.array(sorted(kept))
+
+
+def downsample_series(
+    df: pd.DataFrame, x_col: str, y_col: str, hue: Optional[str] = None, budget: int = PLOT_POINT_BUDGET
+) -> pd.DataFrame:
+    """Downsample each series (one per hue value) to at most `budget` points."""
+    if not pd.api.types.is_numeric_dtype(df[y_col]):
+        return df
+    groups = [group for _, group in df.groupby(hue, sort=False)] if hue else [df]
+    if all(len(group) <= budget for group in groups):
+        return df
+
+    parts: List[pd.DataFrame] = []
+    for group in groups:
+        group = group.dropna(subset=[x_col, y_col])
+        if len(group) <= budget:
+            parts.append(group)
+            continue
+        group = group.sort_values(x_col, kind="stable")
+        x = group[x_col].to_numpy()
+        x = x.astype("datetime64[ns]").astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x
+        y = group[y_col].to_numpy(dtype=float)
+        if PLOT_DOWNSAMPLE_METHOD == "minmax":
+            kept = minmax(y, budget)
+        else:
+            kept = lttb(x.astype(float), y, budget)
+        parts.append(group.iloc[kept])
+    reduced = pd.concat(parts, ignore_index=True)
+    logger.info(f"Downsampled {len(df)} points to {len(reduced)} for plotting")
+    return reduced
+
+
+def bin_histogram(
+    df: pd.DataFrame, x_col: str, hue: Optional[str] = None, bins: int = HISTOGRAM_BINS
+) -> Optional[PlotInput]:
+    """Pre-bin a numeric column into counts per bin (and hue value), with bin edges shared by all groups."""
+    values = df[x_col].dropna()
+    if values.empty:
+        return None
+    edges = np.histogram_bin_edges(values.to_numpy(dtype=float), bins=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    frames = []
+    for name, group in df.groupby(hue, sort=False) if hue else [(None, df)]:
+        counts, _ = np.histogram(group[x_col].dropna().to_numpy(dtype=float), bins=edges)
+        frame = pd.DataFrame({x_col: centers, COUNT_COLUMN: counts})
+        if hue:
+            frame[hue] = name
+        frames.append(frame)
+    return PlotInput(df=pd.concat(frames, ignore_index=True), weights=COUNT_COLUMN, bins=edges.tolist())
+
+
+def bin_histogram_in_clickhouse(
+    query: str, x_col: str, hue: Optional[str] = None, bins: int = HISTOGRAM_BINS
+) -> Optional[PlotInput]:
+    """Bin a numeric column over the full result of `query` in ClickHouse."""
+    x = quote_identifier(x_col)
+    with clickhouse_pool.connection() as client:
+        bounds = run_query(client, f"SELECT toFloat64(min({x})) AS lo, toFloat64(max({x})) AS hi FROM (\n{query}\n)").df
+        if bounds.empty or pd.isna(bounds["lo"].iloc[0]):
+            return None
+        lo, hi = float(bounds["lo"].iloc[0]), float(bounds["hi"].iloc[0])
+        hi = hi if hi > lo else lo + 1
+        width = (hi - lo) / bins
+        group = f"{quote_identifier(hue)}, " if hue else ""
+        counts = run_query(
+            client,
+            f"SELECT {group}least(toUInt32(floor((toFloat64({x}) - {lo!r}) / {width!r})), {bins - 1}) AS bin_index, "
+            f"count() AS {COUNT_COLUMN} FROM (\n{query}\n) WHERE {x} IS NOT NULL GROUP BY {group}bin_index ORDER BY {group}bin_index",
+        ).df
+
+    edges = np.linspace(lo, hi, bins + 1)
+    reduced = counts.assign(**{x_col: lo + (counts["bin_index"].to_numpy(dtype=float) + 0.5) * width})
+    reduced = reduced.drop(columns="bin_index")
+    logger.info(f"Binned histogram of {x_col} in ClickHouse into {len(reduced)} rows")
+    return PlotInput(df=reduced, weights=COUNT_COLUMN, bins=edges.tolist())
+
+
+def aggregate_time_series_in_clickhouse(
+    query: str, x_col: str, y_col: str, hue: Optional[str] = None, budget: int = PLOT_POINT_BUDGET
+) -> Optional[pd.DataFrame]:
+    """Average y over `toStartOfInterval` buckets of x, so each series has about `budget` points."""
+    x = quote_identifier(x_col)
+    with clickhouse_pool.connection() as client:
+        bounds = run_query(client, f"SELECT dateDiff('second', min({x}), max({x})) AS span FROM (\n{query}\n)").df
+        if bounds.empty or pd.isna(bounds["span"].iloc[0]):
+            return None
+        interval = max(1, int(bounds["span"].iloc[0]) // budget)
+        group = f"{quote_identifier(hue)}, " if hue else ""
+        reduced = run_query(
+            client,
+            f"SELECT {group}toStartOfInterval({x}, toIntervalSecond({interval})) AS bucket, "
+            f"avg({quote_identifier(y_col)}) AS value FROM (\n{query}\n) GROUP BY {group}bucket ORDER BY {group}bucket",
+        ).df
+    reduced = reduced.rename(columns={"bucket": x_col, "value": y_col})
+    logger.info(f"Aggregated {x_col} into {interval}s buckets in ClickHouse: {len(reduced)} rows")
+    return reduced
+
+
+def reduce_for_plot(
+    df: pd.DataFrame,
+    plot_type: str,
+    x_col: str,
+    y_col: Optional[str] = None,
+    hue: Optional[str] = None,
+    query: Optional[str] = None,
+    truncated: bool = False,
+    budget: int = PLOT_POINT_BUDGET,
+) -> PlotInput:
+    """Reduce the data of a plot to what can be rendered quickly and legibly.
+
+    Args:
+        df (pd.DataFrame): The data to plot; it is not modified
+        plot_type (str): The create_plot plot type
+        x_col (str): Column for the x-axis
+        y_col (Optional[str]): Column for the y-axis
+        hue (Optional[str]): Column for color grouping
+        query (Optional[str]): SQL that produced `df`, used to aggregate in ClickHouse when `df` is truncated
+        truncated (bool): Whether `df` holds only part of the query result
+        budget (int): Maximum number of points per series
+
+    Returns:
+        PlotInput: The data to render
+    """
+    if df.empty or x_col not in df.columns:
+        return PlotInput(df=df)
+    pushdown = truncated and bool(query)
+
+    if plot_type == "histogram" and pd.api.types.is_numeric_dtype(df[x_col]) and (pushdown or len(df) > budget):
+        try:
+            if pushdown:
+                binned = bin_histogram_in_clickhouse(query, x_col, hue)
+                if binned is not None:
+                    return binned
+        except Exception as e:
+            logger.warning(f"Failed to bin histogram in ClickHouse, binning the stored rows: {e}")
+        return bin_histogram(df, x_col, hue) or PlotInput(df=df)
+
+    if plot_type in ("line", "time series") and y_col:
+        if pushdown and pd.api.types.is_datetime64_any_dtype(df[x_col]):
+            try:
+                aggregated = aggregate_time_series_in_clickhouse(query, x_col, y_col, hue, budget)
+                if aggregated is not None and not aggregated.empty:
+                    df = aggregated
+            except Exception as e:
+                logger.warning(f"Failed to aggregate time series in ClickHouse, downsampling the stored rows: {e}")
+        return PlotInput(df=downsample_series(df, x_col, y_col, hue, budget))
+
+    return PlotInput(df=df)
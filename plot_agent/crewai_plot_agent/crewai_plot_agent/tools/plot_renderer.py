@@ -0,0 +1,192 @@
+"""
+Plot rendering on per-call matplotlib Figures in a bounded pool of worker processes.
+
+pyplot keeps the current figure and style in process-global state, so background
+jobs rendering at the same time in the API can draw into each other's figures.
+`render_plot` instead draws on a `Figure` object created for the call, and runs the
+drawing in a worker process: concurrent jobs render in parallel on separate cores,
+and the style context of one job cannot leak into another.
+
+Workers are forked from a server process that has already imported matplotlib and
+seaborn, and they draw a small figure on startup to load the font cache, so a render
+does not pay any import cost.
+
+Configuration (environment variables):
+- PLOT_RENDER_WORKERS: number of rendering processes, 0 renders in the calling process (default: min(4, CPUs))
+- PLOT_RENDER_TIMEOUT_SECONDS: maximum time to wait for a render (default: 120)
+"""
+
+import matplotlib
+
+matplotlib.use("Agg")  # Set non-GUI backend before importing anything that draws
+
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Union
+
+import matplotlib.style
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+logger = logging.getLogger(__name__)
+
+PLOT_RENDER_WORKERS = int(os.getenv("PLOT_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+PLOT_RENDER_TIMEOUT_SECONDS = float(os.getenv("PLOT_RENDER_TIMEOUT_SECONDS", "120"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+# Style contexts change matplotlib's global rcParams, so in-process renders run one at a time
+_inline_lock = threading.Lock()
+
+
+def draw(
+    df: pd.DataFrame,
+    output_path: str,
+    plot_type: str,
+    x_col: str,
+    y_col: Optional[str] = None,
+    title: Optional[str] = None,
+    hue: Optional[str] = None,
+    figsize: Union[List[float], None] = None,
+    style: str = "seaborn-v0_8-darkgrid",
+    bins: Union[int, List[float]] = 30,
+    weights: Optional[str] = None,
+    dpi: int = 300,
+    image_format: str = "png",
+    thumbnail_path: Optional[str] = None,
+    thumbnail_size: int = 0,
+) -> str:
+    """Draw a plot on a new Figure and save it to output_path (and a thumbnail to thumbnail_path)."""
+    if style not in matplotlib.style.available and style != "default":
+        logger.warning(f"Unknown style {style}, falling back to default style")
+        style = "default"
+
+    with matplotlib.style.context(style):
+        fig = Figure(figsize=tuple(figsize or [12, 8]))
+        ax = fig.subplots()
+
+        if plot_type in ["line", "time series"]:
+            sns.lineplot(data=df, x=x_col, y=y_col, hue=hue, marker="o", ax=ax)
+            if hue:
+                ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left", borderaxespad=0)
+
+        elif plot_type == "bar":
+            sns.barplot(data=df, x=x_col, y=y_col, hue=hue, ax=ax)
+
+        elif plot_type == "scatter":
+            sns.scatterplot(data=df, x=x_col, y=y_col, hue=hue, ax=ax)
+
+        elif plot_type == "histogram":
+            sns.histplot(data=df, x=x_col, hue=hue, bins=bins, weights=weights, ax=ax)
+
+        elif plot_type == "box":
+            sns.boxplot(data=df, x=x_col, y=y_col, hue=hue, ax=ax)
+
+        elif plot_type == "violin":
+            sns.violinplot(data=df, x=x_col, y=y_col, hue=hue, ax=ax)
+
+        else:
+            raise ValueError(f"Unsupported plot type: {plot_type}")
+
+        # Format y-axis for cost values (if dealing with small numbers)
+        if y_col and "cost" in y_col.lower():
+            # Set y-axis to start at 0
+            ax.set_ylim(bottom=0)
+
+            def cost_formatter(x, p):
+                # Only format if value is non-negative
+                if x < 0:
+                    return ""
+                return f"{x:.4f}"
+
+            ax.yaxis.set_major_formatter(FuncFormatter(cost_formatter))
+
+        # Rotate x-axis labels if they're dates or long text
+        if x_col.lower() in ["date", "created_at"] or (
+            isinstance(df[x_col].iloc[0], str) and df[x_col].str.len().max() > 10
+        ):
+            ax.tick_params(axis="x", labelrotation=45)
+            for label in ax.get_xticklabels():
+                label.set_horizontalalignment("right")
+
+        # Set title and labels
+        ax.set_title(title or f"{plot_type.capitalize()} Plot of {y_col or x_col}", pad=20)
+        ax.set_xlabel(x_col)
+        if y_col:
+            ax.set_ylabel(y_col)
+
+        # Adjust layout to prevent label cutoff
+        fig.tight_layout()
+
+        # dpi only applies to raster formats; SVG output is resolution independent
+        fig.savefig(output_path, dpi=dpi, format=image_format, bbox_inches="tight")
+        if thumbnail_path and thumbnail_size:
+            # Resolution that makes the longest side of the figure about thumbnail_size pixels
+            thumbnail_dpi = thumbnail_size / max(fig.get_size_inches())
+            thumbnail_format = "webp" if image_format == "webp" else "png"
+            fig.savefig(thumbnail_path, dpi=thumbnail_dpi, format=thumbnail_format, bbox_inches="tight")
+
+    return output_path
+
+
+def warm_up():
+    """Worker initializer: load fonts and the Agg renderer once, before the first plot."""
+    fig = Figure()
+    fig.subplots().plot([0, 1], [0, 1])
+    fig.savefig(io.BytesIO(), format="png")
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                # Workers fork from a clean server that only imports this module (and so matplotlib and seaborn)
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context("spawn")
+            _executor = ProcessPoolExecutor(max_workers=PLOT_RENDER_WORKERS, mp_context=context, initializer=warm_up)
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def render_plot(df: pd.DataFrame, output_path: str, plot_type: str, x_col: str, **kwargs) -> str:
+    """Render a plot in a worker process (or in-process if PLOT_RENDER_WORKERS is 0).
+
+    Args:
+        df (pd.DataFrame): The data to plot
+        output_path (str): Where to save the plot
+        plot_type (str): line, time series, bar, scatter, histogram, box or violin
+        x_col (str): Column for the x-axis
+        **kwargs: y_col, title, hue, figsize, style, bins, weights and the output options, see `draw`
+
+    Returns:
+        str: output_path
+    """
+    if PLOT_RENDER_WORKERS <= 0:
+        with _inline_lock:
+            return draw(df, output_path, plot_type, x_col, **kwargs)
+
+    future = _get_executor().submit(draw, df, output_path, plot_type, x_col, **kwargs)
+    try:
+        return future.result(timeout=PLOT_RENDER_TIMEOUT_SECONDS)
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool for the next plots
+        logger.error("Plot rendering worker died, restarting the rendering pool")
+        _reset_executor()
+        raise
@@ -1,14 +1,13 @@
 import logging
 import os
-import uuid
-from datetime import datetime
-from typing import List, Optional, Type
+from typing import Dict, List, Optional, Type
 
-import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
 from crewai.tools import BaseTool
-from matplotlib.ticker import FuncFormatter
+from crewai_plot_agent.tools.plan_cache import plan_cache
+from crewai_plot_agent.tools.plot_cache import render_cached
+from crewai_plot_agent.tools.plot_reduction import reduce_for_plot
+from crewai_plot_agent.tools.result_store import result_store
+from crewai_plot_agent.tools.tabular_data import parse_tabular_data
 from pydantic import BaseModel, Field
 
 # Initialize logger
@@ -23,7 +22,11 @@ os.makedirs(PLOTS_DIR, exist_ok=True)
 class PlotQueryInput(BaseModel):
     """Input schema for executing a plotting operation."""
 
-    data: str = Field(..., description="Tabular string data to be plotted.")
+    result_id: Optional[str] = Field(None, description="result_id of a stored query result to plot.")
+    data: Optional[str] = Field(None, description="Tabular string data to plot, only when there is no result_id.")
+    column_types: Optional[Dict[str, str]] = Field(
+        None, description="ClickHouse types of the columns of data (e.g. UInt64, Float32, DateTime64(3)), if known."
+    )
     plot_type: str = Field(..., description="Type of plot (line, bar, scatter, etc.).")
     x_col: str = Field(..., description="Column to use for the X-axis.")
     y_col: Optional[str] = Field(None, description="Column to use for the Y-axis.")
@@ -33,58 +36,18 @@ class PlotQueryInput(BaseModel):
     style: Optional[str] = Field(default="seaborn-v0_8-darkgrid", description="Matplotlib style.")
     palette: Optional[str] = Field(default="husl", description="Color palette.")
     output_path: Optional[str] = Field(None, description="Path to save the plot.")
+    image_format: Optional[str] = Field(None, description="Image format: png, webp or svg.")
+    dpi: Optional[int] = Field(None, description="Resolution of png and webp plots.")
+    thumbnail_size: Optional[int] = Field(None, description="Longest side in pixels of a thumbnail, 0 for none.")
 
 
 class PlotTools(BaseTool):
     name: str = "Plot Generator"
-    description: str = "Generates plots from tabular data."
+    description: str = "Generates plots from a stored query result (by result_id) or from tabular data."
     args_schema: Type[BaseModel] = PlotQueryInput
 
-    def _parse_tabular_data(self, data: str) -> pd.DataFrame:
-        """Convert tabular string data to pandas DataFrame."""
-        try:
-            if not data.strip():
-                logger.warning("Empty data provided for parsing")
-                return pd.DataFrame()
-
-            lines = data.strip().split("\n")
-            logger.info(f"Parsing tabular data with {len(lines)} lines")
-
-            headers = [col.strip() for col in lines[0].split("|") if col.strip()]
-            logger.info(f"Extracted headers: {headers}")
-
-            rows = []
-            for line in lines[1:]:
-                if line.strip() and not line.startswith("-"):
-                    row = [val.strip() for val in line.split("|") if val.strip()]
-                    if len(row) == len(headers):
-                        rows.append(row)
-                    else:
-                        logger.warning(f"Skipping row with mismatched columns: {line}")
-
-            df = pd.DataFrame(rows, columns=headers)
-            for col in df.columns:
-                if "cost" in col.lower():
-                    df[col] = pd.to_numeric(df[col], errors="coerce").abs()
-                else:
-                    try:
-                        df[col] = pd.to_numeric(df[col])
-                    except Exception:
-                        if "time" in col.lower() or "date" in col.lower():
-                            try:
-                                df[col] = pd.to_datetime(df[col])
-                            except Exception:
-                                pass
-
-            logger.info(f"Parsed DataFrame shape: {df.shape}")
-            return df
-        except Exception as e:
-            logger.warning(f"Failed to parse tabular data: {e}")
-            raise ValueError(f"Failed to parse tabular data: {e}")
-
     def _run(
         self,
-        data: str,
         plot_type: str,
         x_col: str,
         y_col: Optional[str] = None,
@@ -95,86 +58,59 @@ class PlotTools(BaseTool):
         palette: Optional[str] = "husl",
         output_path: Optional[str] = None,
         job_id: Optional[str] = None,
+        result_id: Optional[str] = None,
+        data: Optional[str] = None,
+        column_types: Optional[Dict[str, str]] = None,
+        image_format: Optional[str] = None,
+        dpi: Optional[int] = None,
+        thumbnail_size: Optional[int] = None,
     ) -> str:
         """Executes a plotting function and returns the saved file path."""
         try:
-            if output_path is None:
-                # Fallback to datetime-based filename
-                filename = f"plot_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.png"
-                output_path = os.path.join(PLOTS_DIR, filename)
-            elif not os.path.isabs(output_path):
+            # Without an output_path the plot is named after its content, so identical plots are reused
+            if output_path is not None and not os.path.isabs(output_path):
                 output_path = os.path.join(PLOTS_DIR, output_path)
 
-            logger.info(f"Creating {plot_type} plot, saving to: {output_path}")
-
-            try:
-                plt.style.use(style)
-            except Exception as style_error:
-                logger.warning(f"Failed to set style {style}, falling back to default: {style_error}")
-                plt.style.use("default")
-
-            df = self._parse_tabular_data(data)
-
-            plt.figure(figsize=tuple(figsize))
-
-            if plot_type in ["line", "time series"]:
-                sns.lineplot(data=df, x=x_col, y=y_col, hue=hue, marker="o")
-                if hue:
-                    plt.legend(bbox_to_anchor=(1.05, 1), loc="upper left", borderaxespad=0)
-
-            elif plot_type == "bar":
-                sns.barplot(data=df, x=x_col, y=y_col, hue=hue)
-
-            elif plot_type == "scatter":
-                sns.scatterplot(data=df, x=x_col, y=y_col, hue=hue)
-
-            elif plot_type == "histogram":
-                sns.histplot(data=df, x=x_col, hue=hue, bins=30)
-
-            elif plot_type == "box":
-                sns.boxplot(data=df, x=x_col, y=y_col, hue=hue)
-
-            elif plot_type == "violin":
-                sns.violinplot(data=df, x=x_col, y=y_col, hue=hue)
+            logger.info(f"Creating {plot_type} plot with x={x_col}, y={y_col}, hue={hue}")
 
+            # Load the stored query result, or parse inline data
+            if result_id:
+                stored = result_store.entry(result_id)
+                df, query, truncated = stored.df, stored.query, stored.truncated
+            elif data:
+                df, query, truncated = parse_tabular_data(data, column_types), None, False
             else:
-                raise ValueError(f"Unsupported plot type: {plot_type}")
-
-                # Format y-axis for cost values (if dealing with small numbers)
-            if y_col and "cost" in y_col.lower():
-                # Set y-axis to start at 0
-                plt.ylim(bottom=0)
-
-                # Get and print y-axis values
-                y_values = plt.gca().get_yticks()
-                print("Y-axis values before formatting:", y_values)
-
-                def cost_formatter(x, p):
-                    # Only format if value is non-negative
-                    if x < 0:
-                        return ""
-                    return f"{x:.4f}"
-
-                plt.gca().yaxis.set_major_formatter(FuncFormatter(cost_formatter))
-
-            # Rotate x-axis labels if they're dates or long text
-            if x_col.lower() in ["date", "created_at"] or (
-                isinstance(df[x_col].iloc[0], str) and df[x_col].str.len().max() > 10
-            ):
-                plt.xticks(rotation=45, ha="right")
-
-            # Set title and labels
-            plt.title(title or f"{plot_type.capitalize()} Plot of {y_col or x_col}", pad=20)
-            plt.xlabel(x_col)
-            if y_col:
-                plt.ylabel(y_col)
-
-            # Adjust layout to prevent label cutoff
-            plt.tight_layout()
-
-            # Save plot with high DPI
-            plt.savefig(output_path, dpi=300, bbox_inches="tight")
-            plt.close()
+                raise ValueError("Either result_id or data must be provided")
+
+            # Bin or downsample large inputs so render time does not grow with the result size
+            plot_input = reduce_for_plot(df, plot_type, x_col, y_col, hue, query=query, truncated=truncated)
+            df = plot_input.df
+
+            # Draw on a per-call Figure in a rendering worker, unless an identical plot was already rendered
+            output_path = render_cached(
+                df,
+                plot_type,
+                x_col,
+                output_path=output_path,
+                image_format=image_format,
+                dpi=dpi,
+                thumbnail_size=thumbnail_size,
+                y_col=y_col,
+                title=title,
+                hue=hue,
+                figsize=figsize,
+                style=style,
+                bins=plot_input.bins,
+                weights=plot_input.weights,
+            )
+
+            if result_id:
+                # Lets the API cache the SQL and plot parameters under the job's question
+                plan_cache.record_plot(
+                    output_path,
+                    result_store.query(result_id),
+                    {"plot_type": plot_type, "x_col": x_col, "y_col": y_col, "title": title, "hue": hue},
+                )
 
             print(f"Successfully created plot at {output_path}", "SDFDSFSDD")
             return output_path
@@ -5,6 +5,8 @@ from agent_config import (
     PLOT_AGENT_INSTRUCTIONS,
     SQL_AGENT_INSTRUCTIONS,
 )
+from clickhouse_client import run_query
+from clickhouse_pool import clickhouse_pool
 from clickhouse_tools import execute_clickhouse_query
 from dotenv import load_dotenv
 from langchain_core.messages import BaseMessage, HumanMessage
@@ -12,7 +14,9 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import create_react_agent
+from plan_cache import QueryPlan
 from plot_tools import create_plot
+from result_store import result_store
 from traceloop.sdk import Traceloop
 from traceloop.sdk.decorators import agent
 from typing_extensions import TypedDict
@@ -64,6 +68,21 @@ def create_sql_plot_agent(llm, tools_list, prompt):
 
 agent = create_sql_plot_agent(llm, tools_list, prompt)
 
+
+def run_plan(plan: QueryPlan) -> str:
+    """Answer a question from a cached plan without the LLM: run its SQL and render its plot.
+
+    Returns:
+        str: Path of the created plot
+    """
+    with clickhouse_pool.connection() as client:
+        result = run_query(client, plan.sql)
+    if result.df.empty:
+        raise ValueError("The cached query returned no results")
+    result_id = result_store.put(result.df, result.query, truncated=result.truncated)
+    return create_plot.invoke({**plan.plot, "result_id": result_id})
+
+
 # You can visualize the graph structure if running in a notebook environment
 # try:
 #     from IPython.display import Image, display
@@ -12,6 +12,7 @@ SQL_AGENT_INSTRUCTIONS = [
     "- cost, input_tokens, output_tokens, latency_in_ms - for metrics",
     "First, generate an optimized and accurate ClickHouse SQL query based on the user's query. Make sure that only relevant fields are selected and queries are efficient.",
     "Then, always execute the generated SQL query against ClickHouse using a tool call.",
+    "Results are capped in size and queries that would scan too many rows are rejected, so filter on created_at and aggregate in SQL (GROUP BY, toStartOfInterval) instead of selecting raw rows.",
     "Return the SQL query in the format of a SQLQueryResult object.",
     "Please verify if you made the tool call to execute the sql query against clickhouse. If not retry go back to the previous step and make the tool call.",
     "The table structure is defined below in the format of columnName: type: description:",
@@ -46,7 +47,8 @@ SQL_AGENT_INSTRUCTIONS = [
 PLOT_AGENT_DESCRIPTION = "You are an expert in creating data visualizations from SQL query results."
 
 PLOT_AGENT_INSTRUCTIONS = [
-    "You will receive data from Clickhouse SQL queries in a tabular format with columns separated by ' | ' and rows separated by newlines.",
+    "Query results are kept on the server. The SQL tool returns a result_id, the row count, the column types and a preview of the first rows in a tabular format with columns separated by ' | ' and rows separated by newlines.",
+    "Always pass the result_id to create_plot instead of copying rows into the data argument. The preview is only meant for choosing the columns and the plot type.",
     "The data comes from a request_logs table with columns like: id, model_name, request_type, tenant_name, username, prompt, response, input_tokens, output_tokens, latency_in_ms, cost, error_code, error_detail, etc.",
     "Choose appropriate visualizations based on the data type and relationships to show:",
     "- Time series plots for metrics over time using created_at",
@@ -8,11 +8,14 @@ from typing import Any, Dict, List, Union
 
 import matplotlib
 import uvicorn
-from agent import agent
-from fastapi import BackgroundTasks, FastAPI, HTTPException
+from agent import agent, run_plan
+from fastapi import FastAPI, HTTPException
 from fastapi.responses import FileResponse
+from job_queue import QueueFullError, job_queue
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from plan_cache import plan_cache
+from plot_cache import SUPPORTED_FORMATS, thumbnail_path
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
@@ -68,6 +71,7 @@ class JobStatusResponse(BaseModel):
     events: List[Dict[str, Any]]
     plot_result: Union[Dict[str, Any], None] = Field(default=None)
     error: Union[str, None] = Field(default=None)
+    queue_position: Union[int, None] = Field(default=None, description="Position of a queued job, 1 runs next.")
 
 
 # Initialize the agent
@@ -75,21 +79,32 @@ class JobStatusResponse(BaseModel):
 
 
 @app.post("/query", response_model=WorkflowResponse)
-async def execute_query(request: QueryRequest, background_tasks: BackgroundTasks):
+async def execute_query(request: QueryRequest):
     """
     Execute a natural language query to analyze and visualize data.
-    The query will be processed asynchronously.
+    The query is queued and processed asynchronously, at most AGENT_MAX_CONCURRENCY at a time.
     """
     job_id = str(uuid.uuid4())
 
     # Initialize job in the store
-    results_store[job_id] = {"status": "processing", "events": [], "plot_result": None, "error": None}
-
-    # Add task to background
-    background_tasks.add_task(process_query, job_id, request.query)
+    results_store[job_id] = {"status": "queued", "events": [], "plot_result": None, "error": None}
 
+    # Jobs run on worker threads in submission order, so the event loop stays free to serve /status
+    try:
+        job_queue.submit(job_id, process_query, job_id, request.query)
+    except QueueFullError as e:
+        del results_store[job_id]
+        raise HTTPException(status_code=503, detail=str(e))
+
+    position = job_queue.position(job_id)
+    if position is None:
+        return WorkflowResponse(
+            job_id=job_id, status="processing", message="Query is being processed. Check status with /status/{job_id}"
+        )
     return WorkflowResponse(
-        job_id=job_id, status="processing", message="Query is being processed. Check status with /status/{job_id}"
+        job_id=job_id,
+        status="queued",
+        message=f"Query is queued at position {position}. Check status with /status/{{job_id}}",
     )
 
 
@@ -107,14 +122,16 @@ async def get_job_status(job_id: str):
         events=results_store[job_id]["events"],
         plot_result=results_store[job_id]["plot_result"],
         error=results_store[job_id]["error"],
+        queue_position=job_queue.position(job_id),
     )
 
 
 @app.get("/plot/{job_id}")
-async def get_plot(job_id: str):
+async def get_plot(job_id: str, thumbnail: bool = False):
     """
     Get the plot image for a job. Will serve the plot if it exists, even if the job status
     is not "completed" (which can happen if the job fails after creating the plot).
+    With `thumbnail=true`, serves the small preview written when PLOT_THUMBNAIL_SIZE is set.
     """
     if job_id not in results_store:
         logger.error(f"Job {job_id} not found in results store")
@@ -151,21 +168,43 @@ async def get_plot(job_id: str):
             logger.error(f"Plot file not found at path: {plot_path} and no alternatives found")
             raise HTTPException(status_code=404, detail=f"Plot file not found at path: {plot_path}")
 
+    if thumbnail:
+        plot_path = thumbnail_path(plot_path)
+        if not os.path.exists(plot_path):
+            raise HTTPException(status_code=404, detail="No thumbnail available for this plot")
+
     logger.info(f"Serving plot file from: {plot_path}")
     return FileResponse(plot_path)
 
 
-async def process_query(job_id: str, query: str):
+def process_query(job_id: str, query: str):
     """
-    Process the query in the background using LangGraph agent (non-streaming) and update the results store.
+    Process the query on a job queue worker using LangGraph agent (non-streaming) and update the results store.
     """
+    results_store[job_id]["status"] = "processing"
     try:
+        # Repeated questions skip the agent and reuse the SQL and plot of a previous job
+        plan = plan_cache.lookup(query)
+        if plan is not None:
+            try:
+                plot_path = run_plan(plan)
+                results_store[job_id]["events"].append({"event": "plan_cache_hit", "content": plan.sql})
+                results_store[job_id]["plot_result"] = {"plot_path": plot_path, **plan.plot}
+                results_store[job_id]["status"] = "completed"
+                logger.info(f"Job {job_id} completed from cached plan with plot: {plot_path}")
+                return
+            except Exception as e:
+                logger.warning(f"Cached plan failed, falling back to the agent: {e}")
+                plan_cache.invalidate(query)
+
         # Initialize with the user's message in the correct format
         messages = [HumanMessage(content=query)]
 
         # Track visualization completion
         plot_found = False
         plot_result = None
+        # Paths returned by this job's own create_plot calls; only these identify the job's plan
+        created_plots: List[str] = []
 
         try:
             # Invoke the agent to get final output
@@ -173,6 +212,9 @@ async def process_query(job_id: str, query: str):
 
             logger.debug("Agent invocation complete. Processing final result messages...")
 
+            # Arguments of the agent's tool calls, to describe the plot of a create_plot result
+            tool_call_args: Dict[str, Dict[str, Any]] = {}
+
             # First pass: look for explicit plot creation tool results
             for message in final_result["messages"]:
                 logger.debug(f"Processing message: {message}")
@@ -189,18 +231,31 @@ async def process_query(job_id: str, query: str):
 
                     results_store[job_id]["events"].append({"event": message.type, "content": content})
 
-                    # Check for plot creation tool results
-                    if message.type == "tool" and isinstance(message.content, dict):
+                    for tool_call in getattr(message, "tool_calls", None) or []:
+                        tool_call_args[tool_call["id"]] = tool_call.get("args", {})
+
+                    # Check for plot creation tool results; create_plot returns the plot path
+                    if (
+                        message.type == "tool"
+                        and message.name == "create_plot"
+                        and getattr(message, "status", "success") != "error"
+                    ):
                         tool_content = message.content
-                        tool_name = message.name
-                        logger.debug(f"Tool execution: {tool_name} with content: {tool_content}")
+                        logger.debug(f"Tool execution: {message.name} with content: {tool_content}")
 
-                        if tool_name == "create_plot" and "plot_path" in tool_content:
+                        if isinstance(tool_content, dict):
+                            created_path = tool_content.get("plot_path", "")
+                        else:
+                            created_path = str(tool_content).strip()
+                            tool_content = tool_call_args.get(getattr(message, "tool_call_id", None), {})
+
+                        if created_path and os.path.exists(created_path):
                             plot_found = True
+                            created_plots.append(created_path)
 
                             plot_result = {
                                 "plot_type": tool_content.get("plot_type", "unknown"),
-                                "plot_path": tool_content.get("plot_path", ""),
+                                "plot_path": created_path,
                                 "x_col": tool_content.get("x_col", ""),
                                 "y_col": tool_content.get("y_col", ""),
                                 "title": tool_content.get("title", ""),
@@ -232,7 +287,12 @@ async def process_query(job_id: str, query: str):
                 logger.info("No plot found in agent messages. Checking plots directory for recent files...")
                 # Get all files in the plots directory sorted by modification time (newest first)
                 plot_files = sorted(
-                    [f for f in os.listdir(PLOTS_DIR) if f.endswith(".png")],
+                    [
+                        f
+                        for f in os.listdir(PLOTS_DIR)
+                        if f.endswith(tuple(f".{image_format}" for image_format in SUPPORTED_FORMATS))
+                        and not os.path.splitext(f)[0].endswith("_thumb")
+                    ],
                     key=lambda f: os.path.getmtime(os.path.join(PLOTS_DIR, f)),
                     reverse=True,
                 )
@@ -262,6 +322,12 @@ async def process_query(job_id: str, query: str):
             results_store[job_id]["status"] = "completed"
             results_store[job_id]["plot_result"] = plot_result
             logger.info(f"Job {job_id} completed successfully with plot: {plot_result['plot_path']}")
+
+            # Only a plot created by this job's own create_plot call identifies its plan: the newest file
+            # in PLOTS_DIR may belong to another job running at the same time
+            plans = [plan_cache.plan_for_plot(created_path) for created_path in created_plots]
+            if plans and plans[-1] is not None:
+                plan_cache.store(query, plans[-1])
         else:
             if results_store[job_id]["error"] is None:
                 results_store[job_id]["status"] = "failed"
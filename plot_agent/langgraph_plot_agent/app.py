@@ -93,7 +93,7 @@ if st.button("Generate Visualization"):
             job_id = result.get("job_id")
 
             # Poll for status without showing intermediate results
-            max_retries = 30  # About 30 seconds max wait time
+            max_retries = 30  # About 30 seconds max wait time once the job has started
             retries = 0
 
             while retries < max_retries:
@@ -120,6 +120,13 @@ if st.button("Generate Visualization"):
                     elif current_status == "failed":
                         status_placeholder.error("Could not generate visualization from your query.")
                         break
+                    elif current_status == "queued":
+                        # Waiting for a free worker does not count against max_retries: the job is still pending
+                        position = status_result.get("queue_position")
+                        if position:
+                            status_placeholder.info(f"Your query is queued (position {position}). Please wait.")
+                        time.sleep(1)
+                        continue
 
                     # Only update processing message if still running
                     if retries % 5 == 0:  # Update message every 5 seconds
@@ -1,10 +1,11 @@
 import logging
-import os
 from typing import Union
 
-from clickhouse_connect import get_client
+from clickhouse_client import run_query
+from clickhouse_pool import clickhouse_pool
 from dotenv import load_dotenv
 from langchain_core.tools import tool
+from result_store import result_store
 from traceloop.sdk.decorators import task
 
 # Configure logging
@@ -13,64 +14,36 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize ClickHouse client
-client = get_client(
-    host=os.getenv("CLICKHOUSE_HOST"),
-    port=int(os.getenv("CLICKHOUSE_PORT", "443")),
-    username=os.getenv("CLICKHOUSE_USER"),
-    password=os.getenv("CLICKHOUSE_PASSWORD"),
-    database=os.getenv("CLICKHOUSE_DATABASE", "default"),
-)
-
 
 @tool
 # @traceloop_tool(name="execute_clickhouse_query")
 @task(name="execute_clickhouse_query")
 def execute_clickhouse_query(query: str, limit: Union[int, None] = None) -> str:
-    """Execute a ClickHouse query and return formatted results.
+    """Execute a ClickHouse query and keep the result on the server.
+
+    Results are capped at CLICKHOUSE_MAX_RESULT_ROWS rows and queries scanning too much data are rejected,
+    so aggregate in SQL rather than selecting raw rows.
 
     Args:
         query: The SQL query to execute against ClickHouse
         limit: Optional maximum number of rows to return
 
     Returns:
-        A formatted string containing the query results in a tabular format
+        The result_id of the stored result, its row count, column types and a preview of the first rows.
+        Pass the result_id to create_plot to plot the full result.
     """
     try:
         logger.info(f"Executing ClickHouse query: {query}")
 
-        # Add LIMIT clause if specified
-        if limit:
-            query = f"{query.rstrip(';')} LIMIT {limit}"
-
-        result = client.query(query)
+        with clickhouse_pool.connection() as client:
+            result = run_query(client, query, limit=limit)
 
-        if not result.result_rows:
+        if result.df.empty:
             return "No results found"
 
-        # Format the results as a string
-        output = []
-        # Add column headers
-        headers = [col[0] for col in result.column_names]
-        logger.info(f"Query returned columns: {headers}")
-        output.append(" | ".join(headers))
-
-        # Add separator line
-        output.append("-" * len(" | ".join(headers)))
-
-        # Add rows
-        for row in result.result_rows:
-            formatted_row = []
-            for cell in row:
-                if cell is None:
-                    formatted_row.append("NULL")
-                else:
-                    formatted_row.append(str(cell))
-            output.append(" | ".join(formatted_row))
-
-        result_str = "\n".join(output)
-        logger.info(f"Query returned {len(result.result_rows)} rows")
-        return result_str
+        logger.info(f"Query returned {len(result.df)} rows with columns: {result.df.columns.tolist()}")
+        result_id = result_store.put(result.df, result.query, truncated=result.truncated)
+        return result_store.describe(result_id)
 
     except Exception as e:
         logger.warning(f"Failed to execute ClickHouse query: {e}")
@@ -0,0 +1,92 @@
+"""
+FIFO admission queue and bounded worker pool for agent jobs.
+
+The agent, its tools and the ClickHouse client are synchronous, so running a job
+inside an `async def` background task blocks uvicorn's event loop: every `/status`
+poll waits until the running job finishes. Jobs instead run on a pool of worker
+threads, at most `AGENT_MAX_CONCURRENCY` at a time, and the event loop only serves
+requests. Jobs start in submission order; a waiting job's 1-based position in the
+queue is reported by `/status`.
+
+Configuration (environment variables):
+- AGENT_MAX_CONCURRENCY: jobs running at the same time (default: 4)
+- AGENT_QUEUE_MAX_SIZE: jobs waiting for a worker, further jobs are rejected; 0 for unbounded (default: 100)
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "4"))
+AGENT_QUEUE_MAX_SIZE = int(os.getenv("AGENT_QUEUE_MAX_SIZE", "100"))
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while AGENT_QUEUE_MAX_SIZE jobs are already waiting."""
+
+
+class JobQueue:
+    """Runs submitted jobs in FIFO order on a fixed number of worker threads.
+
+    Args:
+        max_concurrency (int): Number of jobs running at the same time
+        max_waiting (int): Maximum number of jobs waiting for a worker, 0 for unbounded
+    """
+
+    def __init__(self, max_concurrency: int = AGENT_MAX_CONCURRENCY, max_waiting: int = AGENT_QUEUE_MAX_SIZE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_waiting = max_waiting
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="agent-job")
+        self._lock = threading.Lock()
+        # Jobs submitted but not started yet, in submission order
+        self._waiting: "OrderedDict[str, None]" = OrderedDict()
+
+    def submit(self, job_id: str, fn: Callable[..., Any], *args) -> Future:
+        """Queue `fn(*args)` as the job `job_id`.
+
+        Raises:
+            QueueFullError: If max_waiting jobs are already waiting
+        """
+        with self._lock:
+            if self.max_waiting and len(self._waiting) >= self.max_waiting:
+                raise QueueFullError(f"Too many queued jobs ({len(self._waiting)}), try again later")
+            self._waiting[job_id] = None
+
+        def run():
+            with self._lock:
+                self._waiting.pop(job_id, None)
+            return fn(*args)
+
+        try:
+            return self._executor.submit(run)
+        except Exception:
+            with self._lock:
+                self._waiting.pop(job_id, None)
+            raise
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of a waiting job in the queue, or None if it is running, done or unknown."""
+        with self._lock:
+            if job_id not in self._waiting:
+                return None
+            for position, waiting_id in enumerate(self._waiting, start=1):
+                if waiting_id == job_id:
+                    return position
+        return None
+
+    def waiting(self) -> int:
+        """Number of jobs waiting for a worker."""
+        with self._lock:
+            return len(self._waiting)
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and (by default) wait for the submitted ones to finish."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+job_queue = JobQueue()
@@ -6,7 +6,7 @@ from pydantic import BaseModel, Field
 class SQLQueryResult(BaseModel):
     query: str = Field(..., description="The SQL query that was executed.")
     column_names: List[str] = Field(..., description="List of column names in the query result.")
-    rows: List[List[str]] = Field(..., description="List of row values, where each row is a list of column values.")
+    result_id: str = Field(..., description="Handle of the result stored on the server by the query tool.")
     error: Union[str, None] = Field(default=None, description="Error message if the query failed.")
 
 
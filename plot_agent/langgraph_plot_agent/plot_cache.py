@@ -0,0 +1,209 @@
+"""
+Output options of rendered plots and a content-addressed cache of plot files.
+
+A plot file is named after a hash of the rendered data, the plot parameters and the
+output options, so an identical plot request returns the existing file instead of
+rendering again. Files are rendered to a temporary name and moved into place, so
+concurrent jobs asking for the same plot never read a partially written file.
+
+After each render, files in the plots directory (plots, thumbnails and plots renamed
+for jobs) older than PLOT_CACHE_MAX_AGE_SECONDS are deleted, then the least recently
+used ones until the directory fits in PLOT_CACHE_MAX_BYTES.
+
+Configuration (environment variables):
+- PLOT_FORMAT: png, webp or svg (default: png)
+- PLOT_DPI: resolution of raster formats (default: 300)
+- PLOT_THUMBNAIL_SIZE: longest side in pixels of a thumbnail written next to each plot, 0 for none (default: 0)
+- PLOT_CACHE_ENABLED: reuse plot files with the same content (default: true)
+- PLOT_CACHE_MAX_AGE_SECONDS: plot files unused for longer are deleted, 0 for no limit (default: 604800, one week)
+- PLOT_CACHE_MAX_BYTES: total size of the plots directory, 0 for no limit (default: 1 GB)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import pandas as pd
+from plot_renderer import render_plot
+
+logger = logging.getLogger(__name__)
+
+PLOTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plots")
+os.makedirs(PLOTS_DIR, exist_ok=True)
+
+SUPPORTED_FORMATS = ("png", "webp", "svg")
+
+PLOT_FORMAT = os.getenv("PLOT_FORMAT", "png").lower()
+PLOT_DPI = int(os.getenv("PLOT_DPI", "300"))
+PLOT_THUMBNAIL_SIZE = int(os.getenv("PLOT_THUMBNAIL_SIZE", "0"))
+PLOT_CACHE_ENABLED = os.getenv("PLOT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PLOT_CACHE_MAX_AGE_SECONDS = float(os.getenv("PLOT_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+PLOT_CACHE_MAX_BYTES = int(os.getenv("PLOT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Part of every key: bump when rendering changes, so files of the old renderer are not reused
+RENDER_VERSION = 1
+
+# Serializes evictions of concurrent jobs
+_eviction_lock = threading.Lock()
+
+
+def thumbnail_path(plot_path: str) -> str:
+    """Path of the thumbnail of a plot: a PNG (or WebP for WebP plots) next to it."""
+    base, extension = os.path.splitext(plot_path)
+    return f"{base}_thumb{'.webp' if extension == '.webp' else '.png'}"
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """Hash of a frame's columns, dtypes and values."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()]).encode())
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    except TypeError:
+        # Unhashable cells (e.g. arrays from ClickHouse Array columns)
+        digest.update(pickle.dumps(df.reset_index(drop=True), protocol=pickle.HIGHEST_PROTOCOL))
+    return digest.hexdigest()
+
+
+def plot_key(df: pd.DataFrame, options: Dict[str, Any]) -> str:
+    """Content address of a plot: its data, plot parameters, style and output options."""
+    params = json.dumps({"render_version": RENDER_VERSION, **options}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{frame_digest(df)}:{params}".encode()).hexdigest()
+
+
+def render_cached(
+    df: pd.DataFrame,
+    plot_type: str,
+    x_col: str,
+    output_path: Optional[str] = None,
+    image_format: Optional[str] = None,
+    dpi: Optional[int] = None,
+    thumbnail_size: Optional[int] = None,
+    **options,
+) -> str:
+    """Render a plot, or reuse the file of an identical earlier plot.
+
+    Args:
+        df (pd.DataFrame): The data to plot
+        plot_type (str): The plot type
+        x_col (str): Column for the x-axis
+        output_path (Optional[str]): Where the plot must be saved; by default it is named after its content
+        image_format (Optional[str]): png, webp or svg (default: PLOT_FORMAT)
+        dpi (Optional[int]): Resolution of raster formats (default: PLOT_DPI)
+        thumbnail_size (Optional[int]): Longest side of the thumbnail in pixels, 0 for none (default: PLOT_THUMBNAIL_SIZE)
+        **options: y_col, title, hue, figsize, style, bins and weights, see `plot_renderer.draw`
+
+    Returns:
+        str: Path of the plot file
+    """
+    image_format = (image_format or PLOT_FORMAT).lower().lstrip(".")
+    if image_format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported plot format: {image_format}. Use one of {', '.join(SUPPORTED_FORMATS)}")
+    render_options = {
+        **options,
+        "dpi": dpi or PLOT_DPI,
+        "image_format": image_format,
+        "thumbnail_size": PLOT_THUMBNAIL_SIZE if thumbnail_size is None else thumbnail_size,
+    }
+
+    if not PLOT_CACHE_ENABLED:
+        if output_path is None:
+            filename = f"plot_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}.{image_format}"
+            output_path = os.path.join(PLOTS_DIR, filename)
+        output_path = _render(df, plot_type, x_col, output_path, render_options)
+        evict_plots()
+        return output_path
+
+    key = plot_key(df, {"plot_type": plot_type, "x_col": x_col, **render_options})
+    cached_path = os.path.join(PLOTS_DIR, f"plot_{key[:32]}.{image_format}")
+    cached_files = [cached_path, thumbnail_path(cached_path)] if render_options["thumbnail_size"] else [cached_path]
+    with _eviction_lock:
+        cached = all(os.path.exists(path) for path in cached_files)
+        if cached:
+            # Keeps the modification time at the last use, like a newly created plot, so eviction spares them
+            for path in cached_files:
+                os.utime(path)
+    if cached:
+        logger.info(f"Reusing cached plot {cached_path}")
+    else:
+        temporary_path = f"{cached_path}.{uuid.uuid4().hex[:8]}.tmp"
+        _render(df, plot_type, x_col, temporary_path, render_options)
+        if render_options["thumbnail_size"]:
+            os.replace(thumbnail_path(temporary_path), thumbnail_path(cached_path))
+        os.replace(temporary_path, cached_path)
+        evict_plots()
+
+    if output_path is None or os.path.abspath(output_path) == cached_path:
+        return cached_path
+    shutil.copyfile(cached_path, output_path)
+    if render_options["thumbnail_size"]:
+        shutil.copyfile(thumbnail_path(cached_path), thumbnail_path(output_path))
+    return output_path
+
+
+def evict_plots(max_age_seconds: float = PLOT_CACHE_MAX_AGE_SECONDS, max_bytes: int = PLOT_CACHE_MAX_BYTES) -> int:
+    """Delete plot files unused for `max_age_seconds`, then the least recently used ones beyond `max_bytes`.
+
+    Args:
+        max_age_seconds (float): Age of the last use (modification time) after which a file is deleted, 0 for no limit
+        max_bytes (int): Total size of the plots directory, 0 for no limit
+
+    Returns:
+        int: Number of deleted files
+    """
+    if not max_age_seconds and not max_bytes:
+        return 0
+    with _eviction_lock:
+        # A plot and its thumbnail are evicted together: [last use, total size, paths] by plot path without extension
+        plots: Dict[str, list] = {}
+        for entry in os.scandir(PLOTS_DIR):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            base = os.path.splitext(entry.path)[0]
+            plot = plots.setdefault(base[: -len("_thumb")] if base.endswith("_thumb") else base, [0.0, 0, []])
+            plot[0] = max(plot[0], stat.st_mtime)
+            plot[1] += stat.st_size
+            plot[2].append(entry.path)
+
+        cutoff = time.time() - max_age_seconds if max_age_seconds else None
+        total = sum(size for _, size, _ in plots.values())
+        removed = 0
+        # Least recently used first
+        for last_use, size, paths in sorted(plots.values(), key=lambda plot: plot[0]):
+            expired = cutoff is not None and last_use < cutoff
+            if not expired and (not max_bytes or total <= max_bytes):
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            total -= size
+    if removed:
+        logger.info(f"Evicted {removed} plot files from {PLOTS_DIR}")
+    return removed
+
+
+def _render(df: pd.DataFrame, plot_type: str, x_col: str, output_path: str, render_options: Dict[str, Any]) -> str:
+    thumbnail_size = render_options["thumbnail_size"]
+    return render_plot(
+        df,
+        output_path,
+        plot_type,
+        x_col,
+        thumbnail_path=thumbnail_path(output_path) if thumbnail_size else None,
+        **render_options,
+    )
@@ -0,0 +1,113 @@
+"""
+In-process cache of ClickHouse query results, shared by all jobs of the API.
+
+Results are keyed on the normalized SQL text, the database and the row cap. Queries
+using relative time functions such as `now()` also include the current time bucket in
+their key, so "last 7 days" results are recomputed at least once per bucket. A hit
+skips ClickHouse entirely, including the `EXPLAIN ESTIMATE` pre-flight check.
+
+Configuration (environment variables):
+- CLICKHOUSE_RESULT_CACHE_TTL_SECONDS: how long results are reused, 0 disables the cache (default: 300)
+- CLICKHOUSE_RESULT_CACHE_MAX_BYTES: memory bound of the cached frames (default: 512 MB)
+- CLICKHOUSE_RESULT_CACHE_TIME_BUCKET_SECONDS: time bucket of queries using now() and similar (default: 60)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+import pandas as pd
+
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("CLICKHOUSE_RESULT_CACHE_TTL_SECONDS", "300"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("CLICKHOUSE_RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+RESULT_CACHE_TIME_BUCKET_SECONDS = int(os.getenv("CLICKHOUSE_RESULT_CACHE_TIME_BUCKET_SECONDS", "60"))
+
+# Quoted literals are kept as they are; whitespace elsewhere is collapsed
+SQL_TOKEN_PATTERN = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)|\s+")
+TIME_FUNCTION_PATTERN = re.compile(r"\b(now|now64|today|yesterday|currentDate|nowInBlock)\s*\(", re.IGNORECASE)
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace outside quoted literals and drop trailing semicolons."""
+    query = query.strip().rstrip(";").strip()
+    return SQL_TOKEN_PATTERN.sub(lambda match: match.group(1) or " ", query)
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+class QueryResultCache:
+    """Thread-safe TTL cache of query results, bounded by the memory of the cached frames.
+
+    Args:
+        ttl_seconds (float): Time after which a cached result is recomputed; 0 disables the cache
+        max_bytes (int): Memory bound; the least recently used results are evicted first
+        time_bucket_seconds (int): Granularity of the time component of keys of time-relative queries
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        time_bucket_seconds: int = RESULT_CACHE_TIME_BUCKET_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.time_bucket_seconds = max(1, time_bucket_seconds)
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, Any]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def key(self, query: str, database: Optional[str], row_cap: int) -> Tuple:
+        sql = normalize_sql(query)
+        bucket = int(time.time() // self.time_bucket_seconds) if TIME_FUNCTION_PATTERN.search(sql) else None
+        return (sql, database, row_cap, bucket)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, _, result = entry
+            if time.monotonic() - created > self.ttl_seconds:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def set(self, key: Tuple, result: Any):
+        """Cache a query result; its size is measured from its `df` frame."""
+        if not self.enabled:
+            return
+        size = frame_bytes(result.df)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), size, result)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: Tuple):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+
+result_cache = QueryResultCache()
@@ -0,0 +1,131 @@
+"""
+Server-side store for ClickHouse query results.
+
+The query tool keeps the typed result frame here and only hands the LLM a short
+`result_id`, the column types and a few preview rows. The plotting tool loads the
+frame back by `result_id`, so result rows never round-trip through the prompt.
+
+Results expire after RESULT_STORE_TTL_SECONDS; beyond RESULT_STORE_MAX_ENTRIES results
+or RESULT_STORE_MAX_BYTES of frame memory, the least recently used are evicted.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+
+RESULT_PREVIEW_ROWS = int(os.getenv("RESULT_PREVIEW_ROWS", "10"))
+RESULT_STORE_TTL_SECONDS = float(os.getenv("RESULT_STORE_TTL_SECONDS", "3600"))
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "256"))
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def format_table(df: pd.DataFrame) -> str:
+    """Format a frame as a ' | ' separated table with a header and separator line."""
+    headers = " | ".join(str(col) for col in df.columns)
+    lines = [headers, "-" * len(headers)]
+    for row in df.itertuples(index=False):
+        lines.append(" | ".join("NULL" if pd.isna(cell) else str(cell) for cell in row))
+    return "\n".join(lines)
+
+
+@dataclass
+class StoredResult:
+    df: pd.DataFrame
+    query: str
+    created: float
+    # Whether the query returned more rows than were kept
+    truncated: bool = False
+    # Memory of the frame, including the contents of object columns
+    size: int = 0
+
+
+class ResultStore:
+    """Thread-safe in-memory store of query result frames, with TTL and LRU eviction.
+
+    Args:
+        ttl_seconds (float): Time after which a result expires
+        max_entries (int): Maximum number of stored results; the least recently used are evicted first
+        max_bytes (int): Memory bound of the stored frames; the least recently used are evicted first.
+            The newest result is always kept, even if it alone exceeds the bound
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = RESULT_STORE_TTL_SECONDS,
+        max_entries: int = RESULT_STORE_MAX_ENTRIES,
+        max_bytes: int = RESULT_STORE_MAX_BYTES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._results: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, df: pd.DataFrame, query: str = "", truncated: bool = False) -> str:
+        """Store a result frame and return its result_id."""
+        result_id = f"res_{uuid.uuid4().hex[:12]}"
+        # Measured outside the lock: deep memory usage scans every value of object columns
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._evict_expired()
+            self._results[result_id] = StoredResult(
+                df=df, query=query, created=time.monotonic(), truncated=truncated, size=size
+            )
+            self._size += size
+            while len(self._results) > 1 and (len(self._results) > self.max_entries or self._size > self.max_bytes):
+                self._remove(next(iter(self._results)))
+        return result_id
+
+    def get(self, result_id: str) -> pd.DataFrame:
+        """Return the frame stored under result_id; raises KeyError if it is unknown or expired."""
+        return self._get(result_id).df
+
+    def entry(self, result_id: str) -> StoredResult:
+        """Return the stored result with its query and truncation flag."""
+        return self._get(result_id)
+
+    def query(self, result_id: str) -> str:
+        """Return the SQL that produced a stored result."""
+        return self._get(result_id).query
+
+    def describe(self, result_id: str, preview_rows: int = RESULT_PREVIEW_ROWS) -> str:
+        """Summarize a stored result for the LLM: result_id, row count, column types and a short preview."""
+        stored = self._get(result_id)
+        df = stored.df
+        columns = ", ".join(f"{col} ({dtype})" for col, dtype in df.dtypes.items())
+        rows = f"{len(df)}"
+        if stored.truncated:
+            rows += " (truncated: the query returned more rows; filter or aggregate in SQL to cover all data)"
+        return (
+            f"result_id: {result_id}\n"
+            f"rows: {rows}\n"
+            f"columns: {columns}\n"
+            f"preview (first {min(preview_rows, len(df))} rows):\n"
+            f"{format_table(df.head(preview_rows))}"
+        )
+
+    def _get(self, result_id: str) -> StoredResult:
+        with self._lock:
+            self._evict_expired()
+            if result_id not in self._results:
+                raise KeyError(f"Unknown or expired result_id: {result_id}")
+            self._results.move_to_end(result_id)
+            return self._results[result_id]
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [key for key, stored in self._results.items() if now - stored.created > self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+
+    def _remove(self, result_id: str):
+        self._size -= self._results.pop(result_id).size
+
+
+result_store = ResultStore()
@@ -0,0 +1,132 @@
+"""
+Answer cache for the RAG pipeline.
+
+Answers are cached per namespace (collection name + pipeline configuration) and looked
+up in two stages:
+- Exact match on the normalized question text
+- Optional semantic match, reusing an answer whose question embedding has a cosine
+  similarity above a threshold
+
+Entries expire after a TTL and the cache is bounded in size with LRU eviction.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, is_dataclass
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from config.settings import settings
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+def config_fingerprint(config: Any) -> str:
+    """Stable short hash of a (dataclass) configuration object."""
+    data = asdict(config) if is_dataclass(config) else config
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+@dataclass
+class _Entry:
+    answer: str
+    expires_at: float
+    embedding: Optional[np.ndarray] = None
+
+
+class AnswerCache:
+    """Thread-safe TTL + LRU cache of generated answers.
+
+    Args:
+        ttl_seconds (float): Time after which an entry is no longer served
+        max_entries (int): Maximum number of cached answers across all namespaces
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        namespace: str,
+        question: str,
+        embedding: Optional[List[float]] = None,
+        similarity_threshold: Optional[float] = None,
+    ) -> Optional[str]:
+        """Return a cached answer for the question, or None on a miss.
+
+        The semantic lookup only runs when both `embedding` and `similarity_threshold`
+        are given and there is no exact match.
+        """
+        key = (namespace, normalize_question(question))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                return entry.answer
+            if embedding is None or similarity_threshold is None:
+                return None
+
+            query = _unit(embedding)
+            best_key, best_score = None, similarity_threshold
+            for candidate_key, candidate in self._entries.items():
+                if candidate_key[0] != namespace or candidate.embedding is None or candidate.expires_at <= now:
+                    continue
+                score = float(np.dot(query, candidate.embedding))
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key].answer
+
+    def set(self, namespace: str, question: str, answer: str, embedding: Optional[List[float]] = None):
+        """Store an answer, evicting expired and least recently used entries as needed."""
+        key = (namespace, normalize_question(question))
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = _Entry(
+                answer=answer,
+                expires_at=now + self.ttl_seconds,
+                embedding=_unit(embedding) if embedding is not None else None,
+            )
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                for expired_key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+                    del self._entries[expired_key]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection_name: str):
+        """Drop all answers cached for a collection (any configuration)."""
+        prefix = f"{collection_name}:"
+        with self._lock:
+            for key in [k for k in self._entries if k[0].startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+# Process-wide cache shared by all pipelines
+answer_cache = AnswerCache(
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -17,15 +19,42 @@ class Settings(BaseSettings):
     QDRANT_API_PORT: int
     QDRANT_API_PREFIX: str
     QDRANT_API_KEY: str
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    # Store vectors on disk (memmap) instead of RAM, and optionally quantize them ("scalar" or "binary")
+    QDRANT_ON_DISK_VECTORS: bool = False
+    QDRANT_QUANTIZATION: Optional[str] = None
+
+    # Vector store backend: "qdrant" (remote server) or "local" (embedded in-process index)
+    VECTOR_STORE_BACKEND: str = "qdrant"
+    LOCAL_VECTOR_STORE_DIR: str = "vector_store"
 
     # Chroma Vector Store Configuration
     CHROMADB_API_URL: str
 
     DEFAULT_COLLECTION_NAME: str = "document_collection"
 
+    # Collection Lifecycle Configuration
+    # Store every upload in DEFAULT_COLLECTION_NAME, filtered by document id, instead of one collection each
+    USE_SHARED_COLLECTION: bool = False
+    COLLECTION_TTL_SECONDS: int = 86400
+    MAX_COLLECTIONS: int = 100
+    COLLECTION_CLEANUP_INTERVAL_SECONDS: int = 300
+    # Largest file accepted by the chunked /uploads endpoints
+    MAX_UPLOAD_SIZE_MB: int = 1024
+
+    # Local cache of prompts pulled from LangChain hub
+    PROMPT_CACHE_DIR: str = ".prompt_cache"
+
+    # Answer Cache Configuration
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024
+
     # LLM Configuration
     LLM_MODEL: str = "openai-main/gpt-4o-mini"
     EMBEDDING_MODEL: str = "openai-main/text-embedding-ada-002"
+    # Vector size of EMBEDDING_MODEL; probed from the model when not set
+    EMBEDDING_DIMENSIONS: Optional[int] = None
 
     @property
     def is_production(self):
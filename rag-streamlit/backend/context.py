@@ -0,0 +1,108 @@
+"""
+Reranking and prompt-context packing for the RAG generate step.
+
+- `cross_encoder_rerank` reorders retrieved chunks with a local cross-encoder model
+- `pack_context` deduplicates overlapping chunks and concatenates them until a
+  prompt token budget is reached
+"""
+
+from functools import lru_cache
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+# Overlaps shorter than this are treated as coincidence rather than splitter overlap
+MIN_OVERLAP_CHARS = 32
+
+
+@lru_cache(maxsize=1)
+def _token_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, falling back to a ~4 characters per token estimate."""
+    encoding = _token_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = _token_encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+@lru_cache(maxsize=2)
+def get_cross_encoder(model_name: str):
+    """Load (once per process) a sentence-transformers cross-encoder."""
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError as e:
+        raise ImportError(
+            "Cross-encoder reranking requires sentence-transformers. Install it with "
+            "`pip install sentence-transformers`"
+        ) from e
+    return CrossEncoder(model_name)
+
+
+def cross_encoder_rerank(question: str, documents: List[Document], top_n: int, model_name: str) -> List[Document]:
+    """Score (question, chunk) pairs with a cross-encoder and keep the `top_n` best chunks."""
+    if not documents:
+        return documents
+    scores = get_cross_encoder(model_name).predict([(question, doc.page_content) for doc in documents])
+    ranked = sorted(zip(scores, range(len(documents))), key=lambda pair: pair[0], reverse=True)
+    return [documents[index] for _, index in ranked[:top_n]]
+
+
+def _overlap_length(previous: str, current: str) -> int:
+    """Length of the longest suffix of `previous` that is also a prefix of `current`."""
+    for length in range(min(len(previous), len(current)), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(current[:length]):
+            return length
+    return 0
+
+
+def pack_context(documents: List[Document], max_tokens: Optional[int] = None, separator: str = "\n\n") -> str:
+    """Build the prompt context from retrieved chunks in rank order.
+
+    Chunks that duplicate (or are contained in) an already packed chunk are skipped, and
+    text a chunk shares with the end of a packed chunk (splitter overlap) is trimmed.
+    Packing stops before the chunk that would exceed `max_tokens`.
+
+    Args:
+        documents (List[Document]): Retrieved chunks, most relevant first
+        max_tokens (Optional[int]): Token budget for the context; None means unlimited
+        separator (str): Separator placed between chunks
+
+    Returns:
+        str: The packed context
+    """
+    packed: List[str] = []
+    used_tokens = 0
+    separator_tokens = count_tokens(separator)
+    for doc in documents:
+        text = doc.page_content.strip()
+        if not text or any(text in previous for previous in packed):
+            continue
+        overlap = max((_overlap_length(previous, text) for previous in packed), default=0)
+        text = text[overlap:].strip()
+        if not text:
+            continue
+
+        tokens = count_tokens(text) + (separator_tokens if packed else 0)
+        if max_tokens is not None and used_tokens + tokens > max_tokens:
+            if not packed:
+                # Never return an empty context because the best chunk alone is too large
+                packed.append(truncate_to_tokens(text, max_tokens))
+            break
+        packed.append(text)
+        used_tokens += tokens
+    return separator.join(packed)
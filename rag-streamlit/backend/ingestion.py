@@ -0,0 +1,94 @@
+"""
+Bulk ingestion helpers for loading document chunks into the vector store.
+
+Chunks are grouped into fixed-size batches which are embedded and upserted
+concurrently by a thread pool. Each batch is retried independently, so a transient
+embedding or Qdrant failure only re-sends the affected batch. Chunk ids are fixed
+before the first attempt, so a retry of an upsert that landed (but whose response was
+lost) overwrites the same points instead of storing the batch twice.
+"""
+
+import logging
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def iter_batches(documents: Iterable[Document], batch_size: int) -> Iterator[List[Document]]:
+    """Yield lists of at most `batch_size` documents from any iterable."""
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _upsert_batch(
+    vector_store: VectorStore, batch: List[Document], ids: List[str], max_retries: int, retry_backoff: float
+) -> int:
+    for attempt in range(1, max_retries + 1):
+        try:
+            vector_store.add_documents(documents=batch, ids=ids)
+            return len(batch)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = retry_backoff * 2 ** (attempt - 1)
+            logger.warning(f"Batch upsert failed (attempt {attempt}/{max_retries}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+    return 0
+
+
+def bulk_add_documents(
+    vector_store: VectorStore,
+    documents: Iterable[Document],
+    batch_size: int = 64,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    retry_backoff: float = 1.0,
+) -> int:
+    """Embed and upsert documents in concurrent batches.
+
+    At most `2 * max_workers` batches are in flight at once, so `documents` can be a
+    lazy iterator (e.g. pages streamed from a parser) without being materialized.
+
+    Args:
+        vector_store (VectorStore): Target vector store
+        documents (Iterable[Document]): Chunks to embed and store
+        batch_size (int): Number of chunks per embedding/upsert request
+        max_workers (int): Number of batches processed concurrently
+        max_retries (int): Attempts per batch before the ingestion fails
+        retry_backoff (float): Base delay in seconds between retries (doubles per attempt)
+
+    Returns:
+        int: Total number of documents stored
+    """
+    total = 0
+    # Chunk ids are derived from a per-run namespace and the chunk's position, so every attempt reuses them
+    namespace = uuid.uuid4()
+    batches = enumerate(iter_batches(documents, batch_size), start=1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for index, batch in batches:
+            first = (index - 1) * batch_size
+            ids = [str(uuid.uuid5(namespace, str(first + offset))) for offset in range(len(batch))]
+            pending[executor.submit(_upsert_batch, vector_store, batch, ids, max_retries, retry_backoff)] = index
+            if len(pending) < 2 * max_workers:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                total += future.result()
+                logger.info(f"Upserted batch {pending.pop(future)} ({total} documents so far)")
+        for future in list(pending):
+            total += future.result()
+            logger.info(f"Upserted batch {pending.pop(future)} ({total} documents so far)")
+    return total
@@ -0,0 +1,99 @@
+"""
+Lifecycle management for the vector store collections created by document uploads.
+
+Every upload either gets its own collection or, with `USE_SHARED_COLLECTION`, is stored
+as a document id inside one shared collection. The registry tracks when each of them
+was last used and removes the ones idle for longer than `COLLECTION_TTL_SECONDS`, as
+well as the least recently used ones beyond `MAX_COLLECTIONS`, so the vector store's
+memory and index size stay bounded.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from cache import answer_cache
+from utils import delete_collection, list_collections, list_document_ids
+
+# Collections created by /init are named "{uuid4}-{extension}"
+UPLOAD_COLLECTION_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}-\.\w+$")
+
+# (collection_name, document_id); document_id is None for per-upload collections
+CollectionKey = Tuple[str, Optional[str]]
+
+
+class CollectionRegistry:
+    """Thread-safe LRU registry of upload collections with TTL-based garbage collection.
+
+    Args:
+        ttl_seconds (float): Idle time after which a collection is deleted
+        max_entries (int): Maximum number of live uploads; the least recently used are deleted first
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._last_used: "OrderedDict[CollectionKey, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: CollectionKey) -> bool:
+        return key in self._last_used
+
+    def touch(self, collection_name: str, document_id: Optional[str] = None):
+        """Mark an upload as used now."""
+        key = (collection_name, document_id)
+        with self._lock:
+            self._last_used[key] = time.monotonic()
+            self._last_used.move_to_end(key)
+
+    def entries(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {"collection_name": name, "document_id": document_id, "idle_seconds": round(now - last_used, 1)}
+                for (name, document_id), last_used in self._last_used.items()
+            ]
+
+    def adopt_existing(self, shared_collection: Optional[str] = None) -> int:
+        """Track uploads left over from previous runs so they eventually expire.
+
+        Args:
+            shared_collection (Optional[str]): Name of the shared collection whose documents are adopted too
+        """
+        adopted = 0
+        for name in list_collections():
+            if UPLOAD_COLLECTION_PATTERN.match(name) and (name, None) not in self:
+                self.touch(name)
+                adopted += 1
+        if shared_collection is not None:
+            for document_id in list_document_ids(shared_collection):
+                if (shared_collection, document_id) not in self:
+                    self.touch(shared_collection, document_id)
+                    adopted += 1
+        return adopted
+
+    def remove(self, collection_name: str, document_id: Optional[str] = None):
+        """Delete an upload from the vector store and forget it."""
+        delete_collection(collection_name, document_id=document_id)
+        answer_cache.invalidate(document_id or collection_name)
+        with self._lock:
+            self._last_used.pop((collection_name, document_id), None)
+
+    def collect_garbage(self) -> List[CollectionKey]:
+        """Delete expired and least recently used uploads, returning the removed keys."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, last_used in self._last_used.items() if now - last_used > self.ttl_seconds]
+            live = [key for key in self._last_used if key not in expired]
+            overflow = live[: max(0, len(live) - self.max_entries)]
+
+        removed = []
+        for collection_name, document_id in expired + overflow:
+            try:
+                self.remove(collection_name, document_id)
+                removed.append((collection_name, document_id))
+            except Exception as e:
+                print(f"Failed to delete collection {collection_name} (document {document_id}): {e}")
+        return removed
@@ -0,0 +1,274 @@
+"""
+Embedded, in-process vector store used as an alternative to a remote Qdrant server.
+
+Each collection is a directory holding:
+- `vectors.f32`: normalized float32 embeddings appended as raw rows and read back as a
+  memory-mapped matrix, so search is a single matrix-vector product with no network hop
+- `documents.jsonl`: one JSON line (id, page_content, metadata) per vector
+- `meta.json`: the vector dimensionality
+
+Search is exact (flat) cosine similarity, which is fast enough for the per-document
+collections created by the app.
+"""
+
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+VECTORS_FILE = "vectors.f32"
+DOCUMENTS_FILE = "documents.jsonl"
+META_FILE = "meta.json"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class LocalVectorStore(VectorStore):
+    """Flat NumPy vector index persisted to memory-mapped files.
+
+    Args:
+        collection_name (str): Name of the collection (sub-directory of `directory`)
+        embedding (Embeddings): Embedding model used for documents and queries
+        directory (str): Root directory under which collections are stored
+    """
+
+    def __init__(self, collection_name: str, embedding: Embeddings, directory: str):
+        self.collection_name = collection_name
+        self._embedding = embedding
+        self.path = Path(directory) / collection_name
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._dim: Optional[int] = None
+        self._documents: List[Document] = []
+        self._ids: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _load(self):
+        meta_path = self.path / META_FILE
+        if meta_path.exists():
+            self._dim = json.loads(meta_path.read_text())["dim"]
+        documents_path = self.path / DOCUMENTS_FILE
+        lines, torn = [], False
+        if documents_path.exists():
+            with documents_path.open() as f:
+                for line in f:
+                    try:
+                        # A line without its newline was cut off by a crash while appending
+                        record = json.loads(line) if line.endswith("\n") else None
+                    except json.JSONDecodeError:
+                        record = None
+                    if record is None:
+                        torn = True
+                        break
+                    lines.append(line)
+                    self._ids.append(record["id"])
+                    self._documents.append(Document(page_content=record["page_content"], metadata=record["metadata"]))
+        if not self._dim:
+            return
+
+        # A crash between the two appends of add_texts leaves rows without documents (or the reverse):
+        # cut both files back to the complete pairs, so the next append starts aligned
+        vectors_path = self.path / VECTORS_FILE
+        row_bytes = 4 * self._dim
+        vectors_size = vectors_path.stat().st_size if vectors_path.exists() else 0
+        count = min(len(self._documents), vectors_size // row_bytes)
+        if vectors_size != count * row_bytes:
+            os.truncate(vectors_path, count * row_bytes)
+        if torn or len(lines) > count:
+            documents_tmp = self.path / f"{DOCUMENTS_FILE}.tmp"
+            with documents_tmp.open("w") as f:
+                f.writelines(lines[:count])
+            os.replace(documents_tmp, documents_path)
+        self._documents, self._ids = self._documents[:count], self._ids[:count]
+
+    def _matrix(self) -> Optional[np.ndarray]:
+        if self._vectors is None and self._documents:
+            self._vectors = np.memmap(
+                self.path / VECTORS_FILE, dtype=np.float32, mode="r", shape=(len(self._documents), self._dim)
+            )
+        return self._vectors
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = _normalize(np.asarray(self._embedding.embed_documents(texts), dtype=np.float32))
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+                (self.path / META_FILE).write_text(json.dumps({"dim": self._dim}))
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(
+                    f"Collection {self.collection_name} stores {self._dim}-dim vectors, got {vectors.shape[1]}"
+                )
+            with (self.path / VECTORS_FILE).open("ab") as f:
+                f.write(vectors.tobytes())
+            with (self.path / DOCUMENTS_FILE).open("a") as f:
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"id": doc_id, "page_content": text, "metadata": metadata}, default=str) + "\n")
+            self._ids.extend(ids)
+            self._documents.extend(Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas))
+            # Re-map lazily on the next search
+            self._vectors = None
+        return ids
+
+    def _top_k(
+        self, embedding: List[float], k: int, filter: Optional[dict] = None
+    ) -> Tuple[List[Document], Optional[np.ndarray], np.ndarray, np.ndarray]:
+        with self._lock:
+            matrix = self._matrix()
+            documents = self._documents
+        if matrix is None or k <= 0:
+            return documents, matrix, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = matrix @ _normalize(np.asarray(embedding, dtype=np.float32))
+        if filter:
+            # Metadata equality filter (e.g. one document of a shared collection)
+            mask = np.fromiter(
+                (all(doc.metadata.get(key) == value for key, value in filter.items()) for doc in documents),
+                dtype=bool,
+                count=len(documents),
+            )
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return documents, matrix, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return documents, matrix, top, scores[top]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        documents, _, indices, scores = self._top_k(embedding, k, filter)
+        return [(documents[i], float(score)) for i, score in zip(indices, scores)]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        documents, matrix, indices, _ = self._top_k(embedding, fetch_k, filter)
+        if len(indices) == 0:
+            return []
+        selected = maximal_marginal_relevance(
+            np.asarray(embedding, dtype=np.float32), np.asarray(matrix[indices]), lambda_mult=lambda_mult, k=k
+        )
+        return [documents[indices[i]] for i in selected]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter
+        )
+
+    def delete_where(self, filter: dict):
+        """Remove every document whose metadata matches `filter`, compacting the files on disk."""
+        with self._lock:
+            matrix = self._matrix()
+            if matrix is None:
+                return
+            keep = [
+                i
+                for i, doc in enumerate(self._documents)
+                if not all(doc.metadata.get(key) == value for key, value in filter.items())
+            ]
+            vectors = np.array(matrix[keep], dtype=np.float32)
+            self._documents = [self._documents[i] for i in keep]
+            self._ids = [self._ids[i] for i in keep]
+            # Searches outside the lock may still read the old memory map: write new files and swap them in,
+            # so the mapped file is never truncated (it stays readable until the last map is released)
+            vectors_tmp = self.path / f"{VECTORS_FILE}.tmp"
+            vectors_tmp.write_bytes(vectors.tobytes())
+            documents_tmp = self.path / f"{DOCUMENTS_FILE}.tmp"
+            with documents_tmp.open("w") as f:
+                for doc_id, doc in zip(self._ids, self._documents):
+                    record = {"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata}
+                    f.write(json.dumps(record, default=str) + "\n")
+            os.replace(vectors_tmp, self.path / VECTORS_FILE)
+            os.replace(documents_tmp, self.path / DOCUMENTS_FILE)
+            # Map the new file on the next search
+            self._vectors = None
+
+    def metadata_values(self, key: str) -> Set[Any]:
+        """Distinct values of a metadata key over all documents, ignoring documents without it."""
+        with self._lock:
+            return {doc.metadata[key] for doc in self._documents if doc.metadata.get(key) is not None}
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def drop(self):
+        """Delete the collection and its files."""
+        with self._lock:
+            self._vectors = None
+            self._documents, self._ids = [], []
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        collection_name: str = "document_collection",
+        directory: str = "vector_store",
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(collection_name, embedding, directory)
+        store.add_texts(texts, metadatas=metadatas)
+        return store
@@ -1,15 +1,82 @@
+import asyncio
 import os
+import re
 import shutil
 import sys
+import time
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from config.settings import settings
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from lifecycle import UPLOAD_COLLECTION_PATTERN, CollectionRegistry
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 from rag_pipeline import RAGConfig, RAGPipeline
+from utils import warmup
+
+collection_registry = CollectionRegistry(
+    ttl_seconds=settings.COLLECTION_TTL_SECONDS,
+    max_entries=settings.MAX_COLLECTIONS,
+)
+
+
+def _forget_pipeline(removed):
+    """Drop the active pipeline if its collection (or document) was deleted."""
+    global rag_pipeline
+    if rag_pipeline is not None and (rag_pipeline.collection_name, rag_pipeline.document_id) in removed:
+        rag_pipeline = None
+
+
+def _remove_abandoned_uploads():
+    """Delete partial chunked uploads that have not been written to for a TTL."""
+    cutoff = time.time() - settings.COLLECTION_TTL_SECONDS
+    for upload_dir in UPLOAD_DIR.iterdir():
+        if not upload_dir.is_dir():
+            continue
+        last_write = max([upload_dir.stat().st_mtime] + [path.stat().st_mtime for path in upload_dir.iterdir()])
+        if last_write < cutoff:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+async def cleanup_collections():
+    """Periodically delete idle upload collections and abandoned uploads."""
+    while True:
+        await asyncio.sleep(settings.COLLECTION_CLEANUP_INTERVAL_SECONDS)
+        try:
+            removed = await run_in_threadpool(collection_registry.collect_garbage)
+            _forget_pipeline(removed)
+            await run_in_threadpool(_remove_abandoned_uploads)
+        except Exception as e:
+            print(f"Collection cleanup failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the LLM/embedding/vector store clients and fetch the prompt before serving traffic.
+    # Best effort: if the hub or gateway is unreachable the API still starts, and the first request retries
+    try:
+        warmup(RAGConfig().prompt_template)
+    except Exception as e:
+        print(f"Warmup failed, clients will be created on first use: {e}")
+    try:
+        collection_registry.adopt_existing(
+            shared_collection=settings.DEFAULT_COLLECTION_NAME if settings.USE_SHARED_COLLECTION else None
+        )
+    except Exception as e:
+        print(f"Could not list existing collections: {e}")
+    cleanup_task = asyncio.create_task(cleanup_collections())
+    yield
+    cleanup_task.cancel()
+
 
 app = FastAPI(
     title="RAG Pipeline",
+    lifespan=lifespan,
     root_path=os.getenv("TFY_SERVICE_ROOT_PATH", ""),
     docs_url="/",
 )
@@ -24,52 +91,176 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 
 class InitRequest(BaseModel):
     filename: str
+    # Size of the file in bytes; /complete checks that it was fully received
+    size: int
 
 
 global rag_pipeline
 rag_pipeline = None
 
 
+SUPPORTED_EXTENSIONS = (".txt", ".pdf")
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# Declared size of a chunked upload, stored next to the partial file
+UPLOAD_SIZE_FILE = "size"
+
+
+def ingest_upload(upload_dir: Path, file_extension: str) -> dict:
+    """Create a collection (or shared-collection document) for an uploaded file and ingest it."""
+    global rag_pipeline
+
+    # Generate a unique document id, used as the collection name unless a shared collection is used
+    document_id = f"{uuid.uuid4()}-{file_extension}"
+    if settings.USE_SHARED_COLLECTION:
+        collection_name = settings.DEFAULT_COLLECTION_NAME
+    else:
+        collection_name, document_id = document_id, None
+
+    # Initialize the RAG pipeline with unique collection name
+    rag_pipeline = RAGPipeline(
+        config=RAGConfig(),
+        collection_name=collection_name,
+        document_id=document_id,
+    )
+    collection_registry.touch(collection_name, document_id)
+    # Add the documents to the vector store
+    chunk_count = rag_pipeline.add_documents(str(upload_dir))
+
+    # Return the status and the filename
+    return {
+        "status": "initialized",
+        "collection_name": collection_name,
+        "document_id": document_id,
+        "chunks": chunk_count,
+    }
+
+
 @app.post("/init")
-async def init_document(file: UploadFile = File(...)):
+def init_document(file: UploadFile = File(...)):
     """
     Initializes the vectorstore and the LangGraph inference chain (thread-level persistence).
     Expects:
       - file: Uploaded file to process (.txt or .pdf files)
+    For large files, prefer the chunked /uploads endpoints.
     """
-    global rag_pipeline
-
     # Validate file extension
-    if not file.filename.lower().endswith((".txt", ".pdf")):
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Only .txt and .pdf files are currently supported")
 
+    # Save the uploaded file in its own directory, so concurrent uploads are ingested separately
+    upload_dir = UPLOAD_DIR / uuid.uuid4().hex
     try:
         # Extract the file extension
         file_extension = os.path.splitext(file.filename)[1]
-        # Generate a unique collection name
-        collection_name = f"{uuid.uuid4()}-{file_extension}"
-        # Save the uploaded file
-        file_path = UPLOAD_DIR / collection_name
-        with file_path.open("wb") as buffer:
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        with (upload_dir / f"document{file_extension}").open("wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
+        return ingest_upload(upload_dir, file_extension)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+    finally:
+        # Remove the uploaded file from the upload directory
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
 
-        # Initialize the RAG pipeline with unique collection name
-        rag_pipeline = RAGPipeline(
-            config=RAGConfig(),
-            collection_name=collection_name,
+def _upload_file(upload_id: str) -> Path:
+    """Return the partial file of a chunked upload, or raise 404."""
+    matches = list((UPLOAD_DIR / upload_id).glob("document.*")) if UPLOAD_ID_PATTERN.match(upload_id) else []
+    if not matches:
+        raise HTTPException(status_code=404, detail=f"Unknown upload: {upload_id}")
+    return matches[0]
+
+
+def _declared_size(file_path: Path) -> int:
+    """Size in bytes declared when the upload of `file_path` was started."""
+    return int((file_path.parent / UPLOAD_SIZE_FILE).read_text())
+
+
+def _open_upload(upload_id: str, offset: int):
+    """Open the partial file of an upload for writing at `offset`, discarding anything after it."""
+    file_path = _upload_file(upload_id)
+    received = file_path.stat().st_size
+    if offset > received:
+        raise HTTPException(status_code=409, detail=f"Offset {offset} is past the {received} bytes received")
+    f = file_path.open("r+b")
+    f.seek(offset)
+    f.truncate()
+    return f, _declared_size(file_path)
+
+
+@app.post("/uploads")
+def create_upload(request: InitRequest):
+    """
+    Starts a chunked upload. Send the file with PUT /uploads/{upload_id}?offset=...,
+    then call POST /uploads/{upload_id}/complete to ingest it.
+    """
+    if not request.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Only .txt and .pdf files are currently supported")
+    if request.size < 0:
+        raise HTTPException(status_code=400, detail="size must not be negative")
+    if request.size > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        raise HTTPException(
+            status_code=413, detail=f"Files larger than {settings.MAX_UPLOAD_SIZE_MB} MB are not accepted"
         )
-        # Add the documents to the vector store
-        rag_pipeline.add_documents(str(UPLOAD_DIR))
 
-        # Return the status and the filename
-        return {"status": "initialized", "collection_name": collection_name}
+    upload_id = uuid.uuid4().hex
+    upload_dir = UPLOAD_DIR / upload_id
+    upload_dir.mkdir(parents=True)
+    (upload_dir / UPLOAD_SIZE_FILE).write_text(str(request.size))
+    (upload_dir / f"document{os.path.splitext(request.filename)[1]}").touch()
+    return {"upload_id": upload_id, "received": 0}
 
+
+@app.get("/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    """
+    Returns how many bytes of a chunked upload were received, to resume an interrupted upload.
+    """
+    return {"upload_id": upload_id, "received": _upload_file(upload_id).stat().st_size}
+
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: int = 0):
+    """
+    Writes the request body at `offset` of the upload, streaming it to disk without buffering.
+    Re-sending a chunk at an earlier offset overwrites everything after it.
+    Writing past the size declared at POST /uploads is rejected.
+    """
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
+
+    # File I/O runs in the thread pool, so a slow disk does not block the event loop
+    f, declared_size = await run_in_threadpool(_open_upload, upload_id, offset)
+    try:
+        async for chunk in request.stream():
+            if f.tell() + len(chunk) > declared_size:
+                raise HTTPException(status_code=413, detail=f"Upload is larger than the declared {declared_size} bytes")
+            await run_in_threadpool(f.write, chunk)
+        received = f.tell()
+    finally:
+        await run_in_threadpool(f.close)
+    return {"upload_id": upload_id, "received": received}
+
+
+@app.post("/uploads/{upload_id}/complete")
+def complete_upload(upload_id: str):
+    """
+    Ingests a fully uploaded file, like /init.
+    """
+    file_path = _upload_file(upload_id)
+    received, declared_size = file_path.stat().st_size, _declared_size(file_path)
+    if received != declared_size:
+        # Keep the partial file, so the client can resume the upload
+        raise HTTPException(status_code=409, detail=f"Received {received} of {declared_size} bytes, resume the upload")
+    try:
+        # The whole upload directory is ingested, so only the document may be left in it
+        (file_path.parent / UPLOAD_SIZE_FILE).unlink()
+        return ingest_upload(file_path.parent, file_path.suffix)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
     finally:
-        # Remove the uploaded file from the upload directory
-        if file_path.exists():
-            os.remove(file_path)
+        shutil.rmtree(file_path.parent, ignore_errors=True)
 
 
 class InferenceRequest(BaseModel):
@@ -90,5 +281,58 @@ async def infer(request: InferenceRequest):
             detail="RAG pipeline not initialized. Please upload a file first",
         )
 
+    collection_registry.touch(rag_pipeline.collection_name, rag_pipeline.document_id)
     # Return the answer
     return {"answer": rag_pipeline.query(request.query)}
+
+
+@app.post("/infer/stream")
+def infer_stream(request: InferenceRequest):
+    """
+    Same as /infer, but streams the answer as plain text chunks while the LLM generates it.
+    Ensure you have called /init before calling /infer/stream.
+    """
+    # Check if the RAG pipeline is initialized
+    if rag_pipeline is None:
+        raise HTTPException(
+            status_code=400,
+            detail="RAG pipeline not initialized. Please upload a file first",
+        )
+
+    collection_registry.touch(rag_pipeline.collection_name, rag_pipeline.document_id)
+    # The generator is iterated in a worker thread, so the event loop is not blocked
+    return StreamingResponse(rag_pipeline.stream_query(request.query), media_type="text/plain; charset=utf-8")
+
+
+@app.get("/collections")
+async def list_upload_collections():
+    """
+    Lists the upload collections (or shared-collection documents) and how long they have been idle.
+    """
+    return {"collections": collection_registry.entries()}
+
+
+@app.delete("/collections/{collection_name}")
+def delete_upload_collection(collection_name: str, document_id: Optional[str] = None):
+    """
+    Deletes an upload collection, or only one document of the shared collection when document_id is given.
+    """
+    key = (collection_name, document_id)
+    is_upload_collection = document_id is None and UPLOAD_COLLECTION_PATTERN.match(collection_name)
+    if key not in collection_registry and not is_upload_collection:
+        raise HTTPException(status_code=404, detail=f"Unknown upload collection: {collection_name}")
+
+    try:
+        collection_registry.remove(collection_name, document_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting collection: {str(e)}")
+    _forget_pipeline([key])
+    return {"status": "deleted", "collection_name": collection_name, "document_id": document_id}
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics: per-node, embedding, vector search and LLM latencies, and answer cache hits.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,67 @@
+"""
+Prometheus metrics for the RAG hot path.
+
+- `rag_node_duration_seconds{node}`: each LangGraph node (retrieve, rerank, generate)
+- `rag_stage_duration_seconds{stage}`: steps inside the generate node (context packing,
+  prompt formatting, LLM call)
+- `rag_embedding_duration_seconds{operation}`: embedding calls (query / documents)
+- `rag_vector_search_duration_seconds{backend}`: vector store and BM25 searches,
+  excluding the query embedding
+- `rag_answer_cache_requests_total{result}`: answer cache hits and misses
+
+The metrics are exposed by the API on `/metrics`.
+"""
+
+import functools
+import time
+from typing import Callable, List
+
+from langchain_core.embeddings import Embeddings
+from prometheus_client import Counter, Histogram
+
+# Buckets from 1ms to 30s, covering in-process search up to slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+NODE_SECONDS = Histogram(
+    "rag_node_duration_seconds", "Duration of RAG graph nodes", ["node"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds", "Duration of steps inside the generate node", ["stage"], buckets=LATENCY_BUCKETS
+)
+EMBEDDING_SECONDS = Histogram(
+    "rag_embedding_duration_seconds", "Duration of embedding calls", ["operation"], buckets=LATENCY_BUCKETS
+)
+VECTOR_SEARCH_SECONDS = Histogram(
+    "rag_vector_search_duration_seconds", "Duration of vector store searches", ["backend"], buckets=LATENCY_BUCKETS
+)
+ANSWER_CACHE_REQUESTS = Counter("rag_answer_cache_requests_total", "Answer cache lookups", ["result"])
+
+
+def timed_node(node: Callable) -> Callable:
+    """Wrap a graph node so its duration is recorded; keeps the name LangGraph uses for the node."""
+    histogram = NODE_SECONDS.labels(node=node.__name__)
+
+    @functools.wraps(node)
+    def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return node(state)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Embeddings wrapper recording the duration of every embedding call."""
+
+    def __init__(self, embeddings: Embeddings):
+        self.wrapped = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with EMBEDDING_SECONDS.labels(operation="documents").time():
+            return self.wrapped.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with EMBEDDING_SECONDS.labels(operation="query").time():
+            return self.wrapped.embed_query(text)
@@ -0,0 +1,82 @@
+"""
+Parallel document parsing for ingestion.
+
+PDF files are split into page ranges that are parsed concurrently in a process pool.
+Pages are yielded as soon as their range is parsed, so splitting and embedding can
+start before the whole document has been read. PDF text is extracted with pypdf, so it
+can differ from what the unstructured loader extracts (no OCR, no layout partitioning).
+Other file types are parsed with LangChain's unstructured loader, one file at a time.
+
+Workers are started with the forkserver (or spawn) method: parsing runs in threads of
+the API server, and forking a multithreaded process can deadlock on locks held by other
+threads (HTTP clients, logging). Each worker imports this module, so it only imports
+what page extraction needs; the unstructured loader is imported where it is used.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+
+def _extract_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract the text of pages [start, stop) of a PDF (runs in a worker process)."""
+    reader = PdfReader(path)
+    return [(number, reader.pages[number].extract_text() or "") for number in range(start, stop)]
+
+
+def _page_documents(path: str, pages: List[Tuple[int, str]]) -> Iterator[Document]:
+    for number, text in pages:
+        if text.strip():
+            yield Document(page_content=text, metadata={"source": path, "page": number})
+
+
+def iter_pdf_pages(path: str, max_workers: Optional[int] = None, pages_per_task: int = 8) -> Iterator[Document]:
+    """Yield one Document per non-empty PDF page, parsing page ranges in parallel.
+
+    Args:
+        path (str): Path to the PDF file
+        max_workers (Optional[int]): Number of parser processes (default: number of CPUs)
+        pages_per_task (int): Pages parsed by a worker per task
+
+    Yields:
+        Document: Page documents, in completion order
+    """
+    page_count = len(PdfReader(path).pages)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers <= 1 or page_count <= pages_per_task:
+        # Not worth a process pool
+        yield from _page_documents(path, _extract_pages(path, 0, page_count))
+        return
+
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(start_method))
+    finished = False
+    try:
+        futures = [
+            executor.submit(_extract_pages, path, start, min(start + pages_per_task, page_count))
+            for start in range(0, page_count, pages_per_task)
+        ]
+        for future in as_completed(futures):
+            yield from _page_documents(path, future.result())
+        finished = True
+    finally:
+        # When the consumer stops early (an ingestion error closes the generator), drop the queued page ranges
+        executor.shutdown(wait=finished, cancel_futures=not finished)
+
+
+def iter_directory(directory: str, max_workers: Optional[int] = None) -> Iterator[Document]:
+    """Yield documents for every file in a directory, parsing PDFs page-parallel."""
+    for path in sorted(Path(directory).iterdir()):
+        if not path.is_file():
+            continue
+        if path.suffix.lower() == ".pdf":
+            yield from iter_pdf_pages(str(path), max_workers=max_workers)
+        else:
+            from langchain_community.document_loaders import UnstructuredFileLoader
+
+            yield from UnstructuredFileLoader(str(path)).lazy_load()
@@ -1,17 +1,29 @@
 import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, TypedDict
+from typing import Iterable, Iterator, List, Optional, Tuple, TypedDict
 
+from cache import answer_cache, config_fingerprint
 from config.settings import settings
+from context import cross_encoder_rerank, pack_context
 from dotenv import load_dotenv
-from langchain import hub
+from ingestion import bulk_add_documents
 from langchain_community.document_loaders import DirectoryLoader
 from langchain_core.documents import Document
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langgraph.graph import START, StateGraph
-from utils import create_vector_store, embeddings, llm
+from metrics import ANSWER_CACHE_REQUESTS, STAGE_SECONDS, VECTOR_SEARCH_SECONDS, timed_node
+from parsing import iter_directory
+from sparse import BM25Index, reciprocal_rank_fusion
+from utils import (
+    DOCUMENT_ID_KEY,
+    create_vector_store,
+    document_filter,
+    get_embeddings,
+    get_llm,
+    load_prompt,
+)
 
 root_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(root_dir))
@@ -36,6 +48,26 @@ class RAGConfig:
         llm_model (str): Name of the language model to use (default: "gpt-4o")
         prompt_template (str): The prompt template ID from LangChain hub (default: "rlm/rag-prompt")
         splitter (str): Text splitter to use ("RecursiveCharacterTextSplitter" or "SemanticChunker")
+        ingest_batch_size (int): Number of chunks embedded and upserted per batch (default: 64)
+        ingest_max_workers (int): Number of batches ingested concurrently (default: 4)
+        ingest_max_retries (int): Attempts per batch before ingestion fails (default: 3)
+        enable_answer_cache (bool): Serve repeated questions from the answer cache (default: True)
+        semantic_cache_threshold (Optional[float]): Cosine similarity above which a cached answer
+            for a similar question is reused; None disables the semantic cache (default: None)
+        rerank (Optional[str]): Rerank stage applied to the retrieved chunks: "mmr", "cross-encoder"
+            or None to keep the similarity order (default: None)
+        rerank_top_n (int): Number of chunks kept after reranking (default: 4)
+        cross_encoder_model (str): sentence-transformers cross-encoder used when rerank="cross-encoder"
+        max_context_tokens (Optional[int]): Token budget for the context packed into the prompt;
+            None packs every retrieved chunk (default: 3000)
+        retrieval_mode (str): "dense" (vector search), "hybrid" (vector + BM25 fused with reciprocal
+            rank fusion) or "sparse" (local BM25 only, no network hop) (default: "dense")
+        on_disk_vectors (Optional[bool]): Keep the collection's vectors on disk instead of RAM;
+            None uses QDRANT_ON_DISK_VECTORS (default: None)
+        quantization (Optional[str]): Vector quantization for new collections ("scalar" or "binary");
+            None uses QDRANT_QUANTIZATION (default: None)
+        parallel_parsing (bool): Parse PDF pages in parallel and stream them to the splitter (default: True)
+        parse_max_workers (Optional[int]): Maximum number of parser processes; None uses the CPU count
     """
 
     chunk_size: int = 1000
@@ -45,6 +77,20 @@ class RAGConfig:
     embedding_model: str = settings.EMBEDDING_MODEL
     prompt_template: str = "rlm/rag-prompt"
     splitter: str = "RecursiveCharacterTextSplitter"
+    ingest_batch_size: int = 64
+    ingest_max_workers: int = 4
+    ingest_max_retries: int = 3
+    enable_answer_cache: bool = True
+    semantic_cache_threshold: Optional[float] = None
+    rerank: Optional[str] = None
+    rerank_top_n: int = 4
+    cross_encoder_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    max_context_tokens: Optional[int] = 3000
+    retrieval_mode: str = "dense"
+    on_disk_vectors: Optional[bool] = None
+    quantization: Optional[str] = None
+    parallel_parsing: bool = True
+    parse_max_workers: Optional[int] = None
 
 
 class DocumentProcessor:
@@ -61,7 +107,7 @@ class DocumentProcessor:
     def __init__(self, config: RAGConfig):
         self.config = config
         if config.splitter == "SemanticChunker":
-            self.text_splitter = SemanticChunker(embeddings=embeddings)
+            self.text_splitter = SemanticChunker(embeddings=get_embeddings(config.embedding_model))
         else:
             self.text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=config.chunk_size, chunk_overlap=config.chunk_overlap
@@ -83,6 +129,39 @@ class DocumentProcessor:
         docs = loader.load()
         return docs
 
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """Split loaded documents into chunks using the configured text splitter.
+
+        Args:
+            documents (List[Document]): Documents returned by `load_local_content`
+
+        Returns:
+            List[Document]: Chunks ready to be embedded
+        """
+        return self.text_splitter.split_documents(documents)
+
+    def iter_local_content(self, directory: str) -> Iterator[Document]:
+        """Lazily load documents from a local directory.
+
+        With `parallel_parsing`, PDFs are parsed page-parallel in a process pool and pages
+        are yielded as soon as they are ready; otherwise this falls back to DirectoryLoader.
+
+        Args:
+            directory (str): Path to the directory containing documents
+
+        Yields:
+            Document: Loaded documents (one per page for PDFs)
+        """
+        if not self.config.parallel_parsing:
+            yield from self.load_local_content(directory)
+            return
+        yield from iter_directory(directory, max_workers=self.config.parse_max_workers)
+
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Split a stream of documents into chunks, one document at a time."""
+        for document in documents:
+            yield from self.text_splitter.split_documents([document])
+
 
 class RAGPipeline:
     """Main implementation of the Retrieval-Augmented Generation (RAG) pipeline.
@@ -99,14 +178,20 @@ class RAGPipeline:
 
     Args:
         config (RAGConfig): Configuration object for the pipeline
+        collection_name (str): Vector store collection holding the documents
+        document_id (Optional[str]): Id of the document inside a shared collection; when set,
+            ingested chunks are tagged with it and retrieval is filtered on it
     """
 
-    def __init__(self, config: RAGConfig, collection_name: str):
+    def __init__(self, config: RAGConfig, collection_name: str, document_id: Optional[str] = None):
         self.config = config
         self.collection_name = collection_name
+        self.document_id = document_id
+        # Identifies this pipeline's documents (for the answer cache)
+        self.source_id = document_id or collection_name
         self._initialize_components()
         self._setup_graph()
-        self.rag_prompt = hub.pull(self.config.prompt_template)
+        self.rag_prompt = load_prompt(self.config.prompt_template)
 
     def _initialize_components(self):
         """Initialize core components of the RAG pipeline.
@@ -115,58 +200,144 @@ class RAGPipeline:
         - Language Model (LLM)
         - Embedding model
         - Vector store
+        - Local BM25 index
         - Document processor
         """
-        self.llm = llm
-        self.embeddings = embeddings
-        self.qdrant_vector_store = create_vector_store(self.collection_name)
+        self.llm = get_llm()
+        self.embeddings = get_embeddings(self.config.embedding_model)
+        self.qdrant_vector_store = create_vector_store(
+            self.collection_name,
+            index_document_id=self.document_id is not None,
+            embedding_model=self.config.embedding_model,
+            on_disk_vectors=self.config.on_disk_vectors,
+            quantization=self.config.quantization,
+        )
+        self.search_filter = document_filter(self.document_id)
+        self.vector_store_backend = settings.VECTOR_STORE_BACKEND
         self.processor = DocumentProcessor(self.config)
+        self.sparse_index = BM25Index()
 
     def _setup_graph(self):
         """Configure the processing graph for RAG operations.
 
         Creates a directed graph that defines the flow of data through the pipeline:
-        1. Retrieval node: Fetches relevant documents
-        2. Generation node: Produces the final answer
+        1. Retrieval node: Fetches relevant documents (dense, BM25 or both fused with RRF)
+        2. Rerank node (only with rerank="cross-encoder"): Keeps the best `rerank_top_n` chunks
+        3. Generation node: Packs the context within the token budget and produces the final answer
         """
 
+        if self.config.retrieval_mode not in ("dense", "hybrid", "sparse"):
+            raise ValueError(f"Unsupported retrieval mode: {self.config.retrieval_mode}")
+        if self.config.rerank not in (None, "mmr", "cross-encoder"):
+            raise ValueError(f"Unsupported rerank option: {self.config.rerank}")
+
         class State(TypedDict):
             question: str
+            question_embedding: Optional[List[float]]
             context: List[Document]
             answer: str
 
-        def retrieve(state: State):
+        def dense_search(state: State) -> List[Document]:
             if self.qdrant_vector_store is None:
                 raise ValueError("Vector store not initialized")
-            retrieved_docs = self.qdrant_vector_store.similarity_search(
-                state["question"], k=self.config.similarity_top_k
-            )
+            # Reuse the embedding computed for the semantic cache lookup, if any
+            query_embedding = state.get("question_embedding") or self.embeddings.embed_query(state["question"])
+            with VECTOR_SEARCH_SECONDS.labels(backend=self.vector_store_backend).time():
+                if self.config.rerank == "mmr":
+                    # MMR runs inside the vector store, which already holds the candidate vectors
+                    return self.qdrant_vector_store.max_marginal_relevance_search_by_vector(
+                        query_embedding,
+                        k=self.config.rerank_top_n,
+                        fetch_k=self.config.similarity_top_k,
+                        filter=self.search_filter,
+                    )
+                return self.qdrant_vector_store.similarity_search_by_vector(
+                    query_embedding, k=self.config.similarity_top_k, filter=self.search_filter
+                )
+
+        def sparse_search(state: State) -> List[Document]:
+            with VECTOR_SEARCH_SECONDS.labels(backend="bm25").time():
+                return self.sparse_index.search(state["question"], k=self.config.similarity_top_k)
+
+        def retrieve(state: State):
+            if self.config.retrieval_mode == "sparse":
+                # Local BM25 only: no embedding call and no vector store round-trip
+                return {"context": sparse_search(state)}
+            retrieved_docs = dense_search(state)
+            if self.config.retrieval_mode == "hybrid":
+                retrieved_docs = reciprocal_rank_fusion([retrieved_docs, sparse_search(state)])
+                retrieved_docs = retrieved_docs[: self.config.similarity_top_k]
             return {"context": retrieved_docs}
 
+        def rerank(state: State):
+            reranked_docs = cross_encoder_rerank(
+                state["question"], state["context"], self.config.rerank_top_n, self.config.cross_encoder_model
+            )
+            return {"context": reranked_docs}
+
         def generate(state: State):
-            docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-            messages = self.rag_prompt.invoke({"question": state["question"], "context": docs_content})
-            response = self.llm.invoke(messages)
+            with STAGE_SECONDS.labels(stage="context_packing").time():
+                docs_content = pack_context(state["context"], max_tokens=self.config.max_context_tokens)
+            with STAGE_SECONDS.labels(stage="prompt_formatting").time():
+                messages = self.rag_prompt.invoke({"question": state["question"], "context": docs_content})
+            with STAGE_SECONDS.labels(stage="llm").time():
+                response = self.llm.invoke(messages)
             return {"answer": response.content}
 
-        graph_builder = StateGraph(State).add_sequence([retrieve, generate])
+        nodes = [retrieve, rerank, generate] if self.config.rerank == "cross-encoder" else [retrieve, generate]
+        nodes = [timed_node(node) for node in nodes]
+        graph_builder = StateGraph(State).add_sequence(nodes)
         graph_builder.add_edge(START, "retrieve")
         self.graph = graph_builder.compile()
 
-    def add_documents(self, directory: str):
+    def add_documents(self, directory: str) -> int:
         """Add new documents to the vector store for future retrieval.
 
+        Documents are parsed, split into chunks, then embedded and upserted in parallel
+        batches (see `RAGConfig.ingest_batch_size` and `RAGConfig.ingest_max_workers`).
+        The stages are streamed, so embedding starts while large PDFs are still being parsed.
+
         Args:
-            documents (List[Document]): List of LangChain Document objects to add
+            directory (str): Path to the directory containing documents to add
+
+        Returns:
+            int: Number of chunks stored
         """
-        # Load the documents from the directory
-        documents = self.processor.load_local_content(directory)
-        # Add the documents to the vector store
-        self.qdrant_vector_store.add_documents(documents=documents)
+        # Stream the documents from the directory (pages are parsed in parallel)
+        documents = self.processor.iter_local_content(directory)
+        # Split the documents into chunks as they arrive
+        chunks = self.processor.iter_chunks(documents)
+        if self.document_id is not None:
+            chunks = map(self._tag_document_id, chunks)
+        # Build the local BM25 index alongside the vector store when sparse retrieval is used
+        if self.config.retrieval_mode != "dense":
+            chunks = self.sparse_index.tee(chunks)
+        # Answers cached for this collection may be stale once new content is added
+        answer_cache.invalidate(self.source_id)
+        # Add the chunks to the vector store
+        return bulk_add_documents(
+            self.qdrant_vector_store,
+            chunks,
+            batch_size=self.config.ingest_batch_size,
+            max_workers=self.config.ingest_max_workers,
+            max_retries=self.config.ingest_max_retries,
+        )
+
+    def _tag_document_id(self, chunk: Document) -> Document:
+        chunk.metadata[DOCUMENT_ID_KEY] = self.document_id
+        return chunk
+
+    @property
+    def cache_namespace(self) -> str:
+        """Answer cache namespace: answers are only shared for the same documents and config."""
+        return f"{self.source_id}:{config_fingerprint(self.config)}"
 
     def query(self, question: str) -> str:
         """Process a query through the RAG pipeline.
 
+        Repeated (or, with `semantic_cache_threshold`, similar) questions are answered
+        from the answer cache without retrieval or an LLM call.
+
         Args:
             question (str): The user's question or query
 
@@ -177,5 +348,63 @@ class RAGPipeline:
             >>> pipeline = RAGPipeline(config)
             >>> answer = pipeline.query("What is RAG?")
         """
-        response = self.graph.invoke({"question": question})
+        answer, question_embedding = self._lookup_cache(question)
+        if answer is not None:
+            return answer
+
+        response = self.graph.invoke({"question": question, "question_embedding": question_embedding})
+        self._store_cache(question, response["answer"], question_embedding)
         return response["answer"]
+
+    def stream_query(self, question: str) -> Iterator[str]:
+        """Process a query through the RAG pipeline, yielding answer tokens as they are generated.
+
+        Args:
+            question (str): The user's question or query
+
+        Yields:
+            str: Chunks of the generated answer (a cached answer is yielded in one piece)
+
+        The answer is cached only once the stream has finished: a stream that fails or is
+        closed early (e.g. the client disconnected) leaves the cache unchanged.
+        """
+        answer, question_embedding = self._lookup_cache(question)
+        if answer is not None:
+            yield answer
+            return
+
+        tokens = []
+        for message, metadata in self.graph.stream(
+            {"question": question, "question_embedding": question_embedding}, stream_mode="messages"
+        ):
+            if metadata.get("langgraph_node") != "generate" or not message.content:
+                continue
+            tokens.append(message.content)
+            yield message.content
+        # Only reached when the graph finished: errors and GeneratorExit propagate past it
+        self._store_cache(question, "".join(tokens), question_embedding)
+
+    def _lookup_cache(self, question: str) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Return the cached answer (if any) and the question embedding used for the lookup."""
+        if not self.config.enable_answer_cache:
+            return None, None
+
+        # Exact matches first: a hit then costs no embedding round-trip
+        question_embedding = None
+        answer = answer_cache.get(self.cache_namespace, question)
+        if answer is None and self.config.semantic_cache_threshold is not None:
+            # Also reused by the retrieval step on a miss
+            question_embedding = self.embeddings.embed_query(question)
+            answer = answer_cache.get(
+                self.cache_namespace,
+                question,
+                embedding=question_embedding,
+                similarity_threshold=self.config.semantic_cache_threshold,
+            )
+        ANSWER_CACHE_REQUESTS.labels(result="miss" if answer is None else "hit").inc()
+        return answer, question_embedding
+
+    def _store_cache(self, question: str, answer: str, question_embedding: Optional[List[float]]):
+        # An empty answer is never worth replaying, so the question is asked again next time
+        if self.config.enable_answer_cache and answer and answer.strip():
+            answer_cache.set(self.cache_namespace, question, answer, embedding=question_embedding)
@@ -0,0 +1,101 @@
+"""
+Local sparse (BM25) index and rank fusion for hybrid retrieval.
+
+The BM25 index lives in process memory and is filled while documents are ingested, so
+keyword-style lookups need no embedding call or vector store round-trip.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Incremental in-memory Okapi BM25 index over document chunks.
+
+    Args:
+        k1 (float): Term frequency saturation parameter
+        b (float): Document length normalization parameter
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._documents: List[Document] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, documents: Iterable[Document]):
+        """Index a batch of documents."""
+        with self._lock:
+            for document in documents:
+                doc_id = len(self._documents)
+                terms = Counter(tokenize(document.page_content))
+                for term, frequency in terms.items():
+                    self._postings[term].append((doc_id, frequency))
+                length = sum(terms.values())
+                self._documents.append(document)
+                self._lengths.append(length)
+                self._total_length += length
+
+    def tee(self, documents: Iterable[Document], batch_size: int = 256) -> Iterator[Document]:
+        """Pass documents through unchanged while indexing them in batches."""
+        batch = []
+        for document in documents:
+            batch.append(document)
+            yield document
+            if len(batch) >= batch_size:
+                self.add(batch)
+                batch = []
+        if batch:
+            self.add(batch)
+
+    def search(self, query: str, k: int = 10) -> List[Document]:
+        """Return the `k` highest scoring documents for the query."""
+        with self._lock:
+            count = len(self._documents)
+            if count == 0:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[int, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings:
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [self._documents[doc_id] for doc_id, _ in best]
+
+
+def _document_key(document: Document) -> Tuple[str, str]:
+    return document.page_content, str(document.metadata.get("source", ""))
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60) -> List[Document]:
+    """Merge several ranked lists with Reciprocal Rank Fusion (score = sum of 1 / (k + rank))."""
+    scores: Dict[Tuple[str, str], float] = defaultdict(float)
+    documents: Dict[Tuple[str, str], Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = _document_key(document)
+            scores[key] += 1.0 / (k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
@@ -1,61 +1,290 @@
 """
 Utility module for initializing and configuring core components of the RAG system.
 
-This module sets up the following components:
+This module provides lazily created, process-wide instances of:
 - Qdrant vector database client for storing and retrieving embeddings
 - OpenAI embeddings model for converting text to vector representations
 - ChatGPT language model for generating responses
-- Vector store interface combining Qdrant with the embeddings model
+- RAG prompt templates, cached on local disk after the first LangChain hub pull
+- Vector store interface combining Qdrant (or the embedded local index) with the embeddings model
+
+Nothing is constructed at import time; call `warmup()` at startup to pay the
+initialization cost before the first request.
 """
 
+import json
 import sys
+import threading
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 
 root_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(root_dir))
 
 # from langchain_chroma import Chroma
 from config.settings import settings  # noqa: E402
+from langchain import hub  # noqa: E402
+from langchain_core.load import dumpd, load  # noqa: E402
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings  # noqa: E402
 from langchain_qdrant import QdrantVectorStore  # noqa: E402
+from local_store import LocalVectorStore  # noqa: E402
+from metrics import InstrumentedEmbeddings  # noqa: E402
 from qdrant_client import QdrantClient  # noqa: E402
-from qdrant_client.http.models import Distance, VectorParams  # noqa: E402
+from qdrant_client.http.models import (  # noqa: E402
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    MatchValue,
+    PayloadSchemaType,
+    PayloadSelectorInclude,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    VectorParams,
+)
+
+# Payload key holding the document id of chunks stored in the shared collection
+DOCUMENT_ID_KEY = "document_id"
+
 
 # Initialize Qdrant client for vector database operations
-qdrant_client = QdrantClient(
-    url=settings.QDRANT_API_URL, port=settings.QDRANT_API_PORT, prefix=settings.QDRANT_API_PREFIX
-)
+@lru_cache(maxsize=1)
+def get_qdrant_client() -> QdrantClient:
+    return QdrantClient(
+        url=settings.QDRANT_API_URL,
+        port=settings.QDRANT_API_PORT,
+        prefix=settings.QDRANT_API_PREFIX,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+        prefer_grpc=settings.QDRANT_PREFER_GRPC,
+    )
+
 
 # Initialize Chroma client for vector database operations
 # chroma_client = HttpClient(
 #     host=settings.CHROMADB_API_URL
 # )
 
+
 # Configure embeddings model for converting text to vectors
-embeddings = OpenAIEmbeddings(
-    model=settings.EMBEDDING_MODEL,
-    api_key=settings.TFY_API_KEY,
-    base_url=settings.TFY_LLM_GATEWAY_BASE_URL,
-)
+@lru_cache(maxsize=4)
+def get_embeddings(model: Optional[str] = None) -> InstrumentedEmbeddings:
+    # Wrapped so every embedding call is recorded in the Prometheus metrics
+    return InstrumentedEmbeddings(
+        OpenAIEmbeddings(
+            model=model or settings.EMBEDDING_MODEL,
+            api_key=settings.TFY_API_KEY,
+            base_url=settings.TFY_LLM_GATEWAY_BASE_URL,
+        )
+    )
+
+
+# Vector size of an embedding model: EMBEDDING_DIMENSIONS if set, otherwise probed once per model
+@lru_cache(maxsize=4)
+def get_embedding_dimension(model: Optional[str] = None) -> int:
+    model = model or settings.EMBEDDING_MODEL
+    if settings.EMBEDDING_DIMENSIONS and model == settings.EMBEDDING_MODEL:
+        return settings.EMBEDDING_DIMENSIONS
+    return len(get_embeddings(model).embed_query("dimension probe"))
+
 
 # Initialize language model for generating responses
-llm = ChatOpenAI(
-    api_key=settings.TFY_API_KEY,
-    model=settings.LLM_MODEL,
-    base_url=settings.TFY_LLM_GATEWAY_BASE_URL,
-)
+@lru_cache(maxsize=1)
+def get_llm() -> ChatOpenAI:
+    return ChatOpenAI(
+        api_key=settings.TFY_API_KEY,
+        model=settings.LLM_MODEL,
+        base_url=settings.TFY_LLM_GATEWAY_BASE_URL,
+    )
 
 
-# Create a collection if it doesn't exist
-def create_vector_store(collection_name):
+def prompt_cache_path(prompt_template: str) -> Path:
+    return Path(settings.PROMPT_CACHE_DIR) / f"{prompt_template.replace('/', '__')}.json"
+
+
+# Load a prompt from the local cache, pulling it from LangChain hub only once
+@lru_cache(maxsize=8)
+def load_prompt(prompt_template: str):
+    cache_path = prompt_cache_path(prompt_template)
+    if cache_path.exists():
+        try:
+            return load(json.loads(cache_path.read_text()))
+        except Exception:
+            print(f"Ignoring unreadable prompt cache {cache_path}")
+
+    prompt = hub.pull(prompt_template)
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(dumpd(prompt)))
+    except OSError as e:
+        print(f"Could not cache prompt {prompt_template}: {e}")
+    return prompt
+
+
+def warmup(prompt_template: str):
+    """Create the shared clients and load the prompt so the first request does not pay for it.
+
+    Failures are not cached (`lru_cache` only stores returned values), so a later call retries.
+    """
+    get_embeddings()
+    get_llm()
+    load_prompt(prompt_template)
+    if settings.VECTOR_STORE_BACKEND != "local":
+        get_qdrant_client()
+
+
+# One LocalVectorStore instance per collection, so every pipeline sees the same in-memory state
+_local_stores = {}
+_local_stores_lock = threading.Lock()
+
+
+def get_local_store(collection_name, embeddings=None):
+    with _local_stores_lock:
+        if collection_name not in _local_stores:
+            _local_stores[collection_name] = LocalVectorStore(
+                collection_name, embeddings or get_embeddings(), directory=settings.LOCAL_VECTOR_STORE_DIR
+            )
+        return _local_stores[collection_name]
+
+
+def _quantization_config(quantization):
+    if quantization is None:
+        return None
+    if quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True))
+    if quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"Unsupported quantization: {quantization}")
+
+
+def _ensure_collection(qdrant_client, collection_name, embedding_model, on_disk, quantization):
+    # The vector size is resolved here, on first use, so an embedding endpoint outage fails the upload, not startup
+    size = get_embedding_dimension(embedding_model)
+    if qdrant_client.collection_exists(collection_name):
+        existing_size = qdrant_client.get_collection(collection_name).config.params.vectors.size
+        if existing_size != size:
+            raise ValueError(
+                f"Collection {collection_name} stores {existing_size}-dim vectors but the embedding model "
+                f"produces {size}-dim vectors"
+            )
+        print(f"Collection {collection_name} already exists, Re using it")
+        return
+
     try:
         qdrant_client.create_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=1536, distance=Distance.COSINE),
+            vectors_config=VectorParams(size=size, distance=Distance.COSINE, on_disk=on_disk),
+            quantization_config=_quantization_config(quantization),
         )
     except Exception:
-        print(f"Collection {settings.DEFAULT_COLLECTION_NAME} already exists, Re using it")
+        # Another worker may have created it concurrently
+        if not qdrant_client.collection_exists(collection_name):
+            raise
+
+
+# Create a collection if it doesn't exist
+def create_vector_store(
+    collection_name,
+    index_document_id=False,
+    embedding_model=None,
+    on_disk_vectors=None,
+    quantization=None,
+):
+    """Return the vector store for a collection, creating the collection if needed.
+
+    The vector size is derived from the embedding model. `on_disk_vectors` and
+    `quantization` ("scalar", "binary" or None) default to QDRANT_ON_DISK_VECTORS and
+    QDRANT_QUANTIZATION and only apply when the Qdrant collection is created.
+    """
+    embeddings = get_embeddings(embedding_model)
+    # Embedded in-process index: no Qdrant round-trip, collections persisted on local disk
+    if settings.VECTOR_STORE_BACKEND == "local":
+        return get_local_store(collection_name, embeddings)
+
+    qdrant_client = get_qdrant_client()
+    _ensure_collection(
+        qdrant_client,
+        collection_name,
+        embedding_model=embedding_model,
+        on_disk=settings.QDRANT_ON_DISK_VECTORS if on_disk_vectors is None else on_disk_vectors,
+        quantization=quantization or settings.QDRANT_QUANTIZATION,
+    )
+
+    if index_document_id:
+        # Keyword index so per-document filters on a shared collection stay fast
+        try:
+            qdrant_client.create_payload_index(
+                collection_name=collection_name,
+                field_name=f"metadata.{DOCUMENT_ID_KEY}",
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+        except Exception as e:
+            print(f"Could not create document id payload index on {collection_name}: {e}")
 
     # Create vector store interface combining Qdrant with embeddings
     qdrant_vector_store = QdrantVectorStore(qdrant_client, collection_name, embeddings)
     return qdrant_vector_store
+
+
+# Search filter restricting results to one document of a shared collection
+def document_filter(document_id):
+    if document_id is None:
+        return None
+    if settings.VECTOR_STORE_BACKEND == "local":
+        return {DOCUMENT_ID_KEY: document_id}
+    return Filter(must=[FieldCondition(key=f"metadata.{DOCUMENT_ID_KEY}", match=MatchValue(value=document_id))])
+
+
+def list_collections():
+    if settings.VECTOR_STORE_BACKEND == "local":
+        directory = Path(settings.LOCAL_VECTOR_STORE_DIR)
+        return [path.name for path in directory.iterdir() if path.is_dir()] if directory.exists() else []
+    return [collection.name for collection in get_qdrant_client().get_collections().collections]
+
+
+# Distinct document ids stored in a (shared) collection, or an empty list if it does not exist
+def list_document_ids(collection_name):
+    if collection_name not in list_collections():
+        return []
+    if settings.VECTOR_STORE_BACKEND == "local":
+        return sorted(get_local_store(collection_name).metadata_values(DOCUMENT_ID_KEY))
+
+    # Scroll through the payloads only; Qdrant 1.11 has no facet counts for a distinct-values query
+    document_ids, offset = set(), None
+    while True:
+        points, offset = get_qdrant_client().scroll(
+            collection_name=collection_name,
+            limit=1024,
+            offset=offset,
+            with_payload=PayloadSelectorInclude(include=[f"metadata.{DOCUMENT_ID_KEY}"]),
+            with_vectors=False,
+        )
+        for point in points:
+            document_id = (point.payload or {}).get("metadata", {}).get(DOCUMENT_ID_KEY)
+            if document_id is not None:
+                document_ids.add(document_id)
+        if offset is None:
+            return sorted(document_ids)
+
+
+# Delete a whole collection, or only the chunks of one document when `document_id` is given
+def delete_collection(collection_name, document_id=None):
+    if settings.VECTOR_STORE_BACKEND == "local":
+        store = get_local_store(collection_name)
+        if document_id is None:
+            store.drop()
+            with _local_stores_lock:
+                _local_stores.pop(collection_name, None)
+        else:
+            store.delete_where({DOCUMENT_ID_KEY: document_id})
+        return
+
+    if document_id is None:
+        get_qdrant_client().delete_collection(collection_name=collection_name)
+    else:
+        get_qdrant_client().delete(
+            collection_name=collection_name, points_selector=FilterSelector(filter=document_filter(document_id))
+        )
@@ -0,0 +1,246 @@
+"""
+Load-test and latency benchmark for the RAG backend, using local stubs only.
+
+The benchmark starts a stub OpenAI-compatible server (see `stub_openai.py`), points the
+backend at it, uses the embedded local vector store instead of Qdrant, then:
+1. Uploads synthetic documents to /init concurrently (ingestion docs/sec and chunks/sec)
+2. Sends unique questions to /infer and /infer/stream concurrently (QPS, latency, time to first token)
+3. Runs the graph in-process to break latency down per node (retrieve, rerank, generate)
+
+Usage:
+    python benchmark/run_benchmark.py --documents 20 --queries 200 --concurrency 8 --json results.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.append(str(BACKEND_DIR))
+
+import requests  # noqa: E402
+from stub_openai import create_app, serve_in_thread  # noqa: E402
+
+WORDS = (
+    "model data pipeline latency vector index query document chunk embedding retrieval answer context "
+    "prompt token cache throughput request service deploy cluster gateway metric score rank search"
+).split()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies, wall_time):
+    """Latency percentiles in milliseconds and throughput for one phase."""
+    return {
+        "count": len(latencies),
+        "qps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def make_document(index, size_kb):
+    rng = random.Random(index)
+    words, size = [], 0
+    while size < size_kb * 1024:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + ". "
+        words.append(sentence)
+        size += len(sentence)
+    return "".join(words)
+
+
+def configure_environment(args, workdir):
+    """Point the backend settings at the stubs and the local vector store."""
+    os.environ.update(
+        {
+            "ENVIRONMENT": "development",
+            "PROD_API_URL": f"http://127.0.0.1:{args.backend_port}",
+            "DEV_API_URL": f"http://127.0.0.1:{args.backend_port}",
+            "TFY_API_KEY": "stub",
+            "TFY_LLM_GATEWAY_BASE_URL": f"http://127.0.0.1:{args.stub_port}",
+            "QDRANT_API_URL": "http://127.0.0.1",
+            "QDRANT_API_PORT": "6333",
+            "QDRANT_API_PREFIX": "",
+            "QDRANT_API_KEY": "",
+            "CHROMADB_API_URL": "",
+            "VECTOR_STORE_BACKEND": "local",
+            "LOCAL_VECTOR_STORE_DIR": str(workdir / "vector_store"),
+            "PROMPT_CACHE_DIR": str(workdir / "prompt_cache"),
+            "EMBEDDING_DIMENSIONS": str(args.dimensions),
+        }
+    )
+
+
+def write_stub_prompt(prompt_template):
+    """Seed the prompt cache so the backend never pulls from LangChain hub."""
+    from langchain_core.load import dumpd
+    from langchain_core.prompts import ChatPromptTemplate
+    from utils import prompt_cache_path
+
+    prompt = ChatPromptTemplate.from_messages(
+        [("human", "Answer the question using the context.\nQuestion: {question}\nContext: {context}\nAnswer:")]
+    )
+    path = prompt_cache_path(prompt_template)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(dumpd(prompt)))
+
+
+def check(response):
+    if not response.ok:
+        raise RuntimeError(f"{response.request.method} {response.url} failed ({response.status_code}): {response.text}")
+    return response
+
+
+def run_concurrently(function, items, concurrency):
+    """Call `function` on every item from a thread pool; return per-call results and wall time."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(function, items))
+    return results, time.perf_counter() - start
+
+
+def benchmark_ingestion(base_url, args):
+    documents = [make_document(i, args.doc_size_kb) for i in range(args.documents)]
+
+    def upload(index):
+        start = time.perf_counter()
+        files = {"file": (f"document_{index}.txt", documents[index].encode(), "text/plain")}
+        response = check(requests.post(f"{base_url}/init", files=files, timeout=600))
+        return time.perf_counter() - start, response.json().get("chunks") or 0
+
+    results, wall_time = run_concurrently(upload, range(args.documents), args.concurrency)
+    summary = summarize([latency for latency, _ in results], wall_time)
+    summary["docs_per_sec"] = summary.pop("qps")
+    summary["chunks_per_sec"] = round(sum(chunks for _, chunks in results) / wall_time, 1)
+    return summary
+
+
+def benchmark_inference(base_url, args):
+    def infer(index):
+        start = time.perf_counter()
+        # Unique questions, so the answer cache does not short-circuit the pipeline
+        check(requests.post(f"{base_url}/infer", json={"query": f"What is the model latency? #{index}"}))
+        return time.perf_counter() - start
+
+    latencies, wall_time = run_concurrently(infer, range(args.queries), args.concurrency)
+    return summarize(latencies, wall_time)
+
+
+def benchmark_streaming(base_url, args):
+    def infer_stream(index):
+        start = time.perf_counter()
+        first_token = None
+        payload = {"query": f"How is the vector index searched? #{index}"}
+        with check(requests.post(f"{base_url}/infer/stream", json=payload, stream=True)) as response:
+            for chunk in response.iter_content(chunk_size=None):
+                if chunk and first_token is None:
+                    first_token = time.perf_counter() - start
+        return first_token or 0.0, time.perf_counter() - start
+
+    results, wall_time = run_concurrently(infer_stream, range(args.queries), args.concurrency)
+    summary = summarize([total for _, total in results], wall_time)
+    summary["ttft_p50_ms"] = round(percentile([ttft for ttft, _ in results], 50) * 1000, 1)
+    summary["ttft_p95_ms"] = round(percentile([ttft for ttft, _ in results], 95) * 1000, 1)
+    return summary
+
+
+def benchmark_nodes(args):
+    """Time each graph node in-process from the gaps between `updates` stream events."""
+    from rag_pipeline import RAGConfig, RAGPipeline
+
+    pipeline = RAGPipeline(RAGConfig(enable_answer_cache=False), collection_name="benchmark-nodes")
+    with tempfile.TemporaryDirectory() as directory:
+        (Path(directory) / "document.txt").write_text(make_document(0, args.doc_size_kb))
+        pipeline.add_documents(directory)
+
+    node_latencies = {}
+    for index in range(args.node_queries):
+        last = time.perf_counter()
+        for update in pipeline.graph.stream({"question": f"Which metric is ranked? #{index}"}, stream_mode="updates"):
+            now = time.perf_counter()
+            for node in update:
+                node_latencies.setdefault(node, []).append(now - last)
+            last = now
+    return {node: summarize(latencies, sum(latencies)) for node, latencies in node_latencies.items()}
+
+
+def print_report(results):
+    print(f"\n{'phase':<22}{'count':>7}{'rate/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for phase, summary in results.items():
+        rate = summary.get("qps", summary.get("docs_per_sec", 0))
+        print(
+            f"{phase:<22}{summary['count']:>7}{rate:>10}"
+            f"{summary['p50_ms']:>10}{summary['p95_ms']:>10}{summary['p99_ms']:>10}"
+        )
+    ingestion = results.get("ingestion")
+    if ingestion:
+        print(f"\ningestion: {ingestion['docs_per_sec']} docs/sec, {ingestion['chunks_per_sec']} chunks/sec")
+    streaming = results.get("infer_stream")
+    if streaming:
+        print(f"time to first token: p50 {streaming['ttft_p50_ms']} ms, p95 {streaming['ttft_p95_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10, help="Documents uploaded to /init")
+    parser.add_argument("--doc-size-kb", type=int, default=50, help="Size of each synthetic document")
+    parser.add_argument("--queries", type=int, default=100, help="Requests sent to /infer and /infer/stream")
+    parser.add_argument("--node-queries", type=int, default=50, help="In-process queries for per-node timing")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client requests")
+    parser.add_argument("--dimensions", type=int, default=256, help="Stub embedding size")
+    parser.add_argument("--embedding-latency-ms", type=float, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--token-delay-ms", type=float, default=5)
+    parser.add_argument("--stub-port", type=int, default=8101)
+    parser.add_argument("--backend-port", type=int, default=8102)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    json_path = Path(args.json).resolve() if args.json else None
+    workdir = Path(tempfile.mkdtemp(prefix="rag-benchmark-"))
+    configure_environment(args, workdir)
+    # The backend creates its upload directory relative to the working directory
+    os.chdir(workdir)
+
+    serve_in_thread(
+        create_app(
+            dimensions=args.dimensions,
+            embedding_latency=args.embedding_latency_ms / 1000,
+            llm_latency=args.llm_latency_ms / 1000,
+            token_delay=args.token_delay_ms / 1000,
+        ),
+        args.stub_port,
+    )
+    from rag_pipeline import RAGConfig
+
+    write_stub_prompt(RAGConfig().prompt_template)
+    from main import app
+
+    serve_in_thread(app, args.backend_port)
+    base_url = f"http://127.0.0.1:{args.backend_port}"
+
+    results = {"ingestion": benchmark_ingestion(base_url, args)}
+    results["infer"] = benchmark_inference(base_url, args)
+    results["infer_stream"] = benchmark_streaming(base_url, args)
+    for node, summary in benchmark_nodes(args).items():
+        results[f"node:{node}"] = summary
+
+    print_report(results)
+    if json_path:
+        json_path.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Stub OpenAI-compatible server for benchmarking the RAG backend without external services.
+
+Serves `/embeddings` (deterministic hash-based vectors) and `/chat/completions`
+(fixed answer, optionally streamed token by token) with configurable latencies, so
+benchmark numbers reflect the backend itself rather than a remote model.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+STUB_ANSWER = (
+    "Based on the provided context, the document describes the requested topic in detail. "
+    "The key points are summarized above and supported by the retrieved passages."
+)
+
+
+def stub_embedding(value, dimensions: int) -> list:
+    """Deterministic unit vector derived from the input (text or token ids)."""
+    seed = int.from_bytes(hashlib.sha256(json.dumps(value).encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def create_app(dimensions: int = 256, embedding_latency: float = 0.02, llm_latency: float = 0.2, token_delay=0.005):
+    """Build the stub app.
+
+    Args:
+        dimensions (int): Size of the returned embeddings
+        embedding_latency (float): Seconds added to every embeddings request
+        llm_latency (float): Seconds before the first completion token
+        token_delay (float): Seconds between streamed completion tokens
+    """
+    app = FastAPI(title="Stub OpenAI API")
+
+    @app.post("/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        # A single string (or a single list of token ids) is one input
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        await asyncio.sleep(embedding_latency)
+        return {
+            "object": "list",
+            "model": body.get("model", "stub"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": stub_embedding(value, dimensions)}
+                for i, value in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "stub")
+        await asyncio.sleep(llm_latency)
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": STUB_ANSWER}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+
+        async def events():
+            for token in STUB_ANSWER.split(" "):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def serve_in_thread(app: FastAPI, port: int) -> uvicorn.Server:
+    """Run an ASGI app with uvicorn in a daemon thread and wait until it accepts requests."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
@@ -1,5 +1,3 @@
-from pathlib import Path
-
 from pydantic_settings import BaseSettings
 
 
@@ -11,7 +9,10 @@ class Settings(BaseSettings):
     DEV_API_URL: str
 
     # File Upload Configuration
-    UPLOAD_DIR: Path = Path("uploaded_files")
+    UPLOAD_CHUNK_SIZE_MB: int = 8
+    UPLOAD_MAX_RETRIES: int = 3
+    # Ingestion of large documents can take minutes
+    INGEST_TIMEOUT_SECONDS: int = 900
 
     @property
     def is_production(self):
@@ -1,6 +1,4 @@
-import os
 import sys
-import uuid
 from pathlib import Path
 
 import requests
@@ -11,9 +9,54 @@ from config.settings import settings
 root_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(root_dir))
 
-# Create uploaded_files directory if it doesn't exist
-UPLOAD_DIR = Path("uploaded_files")
-UPLOAD_DIR.mkdir(exist_ok=True)
+
+def upload_document(uploaded_file, progress_bar):
+    """Stream the file to the backend in chunks, resuming from the server's offset after a failure.
+
+    The file is read chunk by chunk straight from Streamlit's upload buffer, so it is never
+    written to local disk or copied whole. Only connection errors, timeouts and 5xx responses
+    are retried; a 4xx response (e.g. 413 for a file above the backend's size cap) is returned
+    as is, so its detail can be shown.
+    """
+    api_url = settings.API_URL
+    chunk_size = settings.UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
+    total = uploaded_file.size
+
+    response = requests.post(f"{api_url}/uploads", json={"filename": uploaded_file.name, "size": total}, timeout=30)
+    if not response.ok:
+        return response
+    upload_id = response.json()["upload_id"]
+
+    offset, failures = 0, 0
+    while offset < total:
+        uploaded_file.seek(offset)
+        chunk = uploaded_file.read(chunk_size)
+        response, error = None, None
+        try:
+            response = requests.put(
+                f"{api_url}/uploads/{upload_id}", params={"offset": offset}, data=chunk, timeout=120
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        if response is not None and response.status_code < 500:
+            if not response.ok:
+                # Retrying a client error would fail the same way
+                return response
+            offset = response.json()["received"]
+            failures = 0
+        else:
+            failures += 1
+            if failures > settings.UPLOAD_MAX_RETRIES:
+                if response is not None:
+                    return response
+                raise error
+            # Resume from what the backend actually stored
+            offset = requests.get(f"{api_url}/uploads/{upload_id}", timeout=30).json()["received"]
+        progress_bar.progress(min(offset / total, 1.0), text=f"📤 Uploading... {offset // 1024 // 1024} MB")
+
+    progress_bar.progress(1.0, text="🛠 Processing document... Getting it ready for Q&A!")
+    return requests.post(f"{api_url}/uploads/{upload_id}/complete", timeout=settings.INGEST_TIMEOUT_SECONDS)
+
 
 # Page Title
 st.markdown("## 📄 Document Chat with FastAPI Inference")
@@ -33,43 +76,26 @@ if uploaded_file is not None:
         st.session_state.uploaded = False  # Hide chat until processing is done
         st.session_state.user_query = ""  # Clear input state
 
-        # Remove previously uploaded file (if exists)
-        if "file_path" in st.session_state:
-            old_file = Path(st.session_state.file_path)
-            if old_file.exists():
-                old_file.unlink()  # Delete old file
-
-        # Generate unique filename for new upload
-        file_extension = os.path.splitext(uploaded_file.name)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = UPLOAD_DIR / unique_filename
-
-        # Save the new file
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        progress_bar = st.progress(0.0, text="📤 Uploading...")
+        try:
+            response = upload_document(uploaded_file, progress_bar)
 
-        st.session_state.file_path = str(file_path)
-
-        # Show loading spinner
-        with st.spinner("🛠 Processing document... Getting it ready for Q&A!"):
-            try:
-                with open(file_path, "rb") as f:
-                    files = {"file": (unique_filename, f, "application/octet-stream")}
-                    response = requests.post(f"{settings.API_URL}/init", files=files, timeout=60)
-
-                if response.status_code == 200:
-                    st.success("✅ Document uploaded & initialized successfully!")
-                    st.session_state.uploaded = True
-                    st.rerun()  # Force rerun to refresh UI
-                else:
+            if response.status_code == 200:
+                st.success("✅ Document uploaded & initialized successfully!")
+                st.session_state.uploaded = True
+                st.rerun()  # Force rerun to refresh UI
+            else:
+                try:
                     error_detail = response.json().get("detail", "Unknown error")
-                    st.error(f"❌ Error: {error_detail}")
-                    file_path.unlink(missing_ok=True)  # Clean up
-                    st.session_state.uploaded = False
-            except requests.exceptions.RequestException as e:
-                file_path.unlink(missing_ok=True)
-                st.error(f"❌ Connection error: {str(e)}")
+                except ValueError:
+                    error_detail = f"{response.status_code} {response.reason}"
+                st.error(f"❌ Error: {error_detail}")
                 st.session_state.uploaded = False
+        except requests.exceptions.RequestException as e:
+            st.error(f"❌ Connection error: {str(e)}")
+            st.session_state.uploaded = False
+        finally:
+            progress_bar.empty()
 
 # Only show chat if document is fully processed and uploaded
 if "uploaded" in st.session_state and st.session_state.uploaded:
@@ -80,20 +106,21 @@ if "uploaded" in st.session_state and st.session_state.uploaded:
         submit_button = st.form_submit_button("🚀 Send")
 
     if submit_button and user_query:
-        infer_url = f"{settings.API_URL}/infer"
+        infer_url = f"{settings.API_URL}/infer/stream"
         payload = {"query": user_query}
 
-        with st.spinner("🤖 Thinking..."):
-            try:
-                response = requests.post(infer_url, json=payload)
+        try:
+            with st.spinner("🤖 Thinking..."):
+                response = requests.post(infer_url, json=payload, stream=True)
+            with response:
                 if response.status_code == 200:
-                    answer = response.json().get("answer", "")
                     st.markdown("### 👨‍💬 Response")
-                    st.write(answer)
+                    # Render tokens as they arrive instead of waiting for the full answer
+                    st.write_stream(response.iter_content(chunk_size=None, decode_unicode=True))
                 else:
                     error_message = response.json().get("detail", response.text)
                     st.error(f"❌ Inference failed: {error_message}")
-            except requests.exceptions.RequestException as e:
-                st.error(f"❌ Connection error: {str(e)}")
+        except requests.exceptions.RequestException as e:
+            st.error(f"❌ Connection error: {str(e)}")
     elif submit_button:
         st.warning("⚠️ Please enter a question.")